@@ -4,10 +4,7 @@ scene editor. Blender is a 3D graphics program that seems like it would
 be a good fit. This exporter converts from a blender file into a .scn file
 that can be loaded into bevy.
 """
-import os
-import sys
 import logging
-import copy
 
 import bpy
 from bpy.app.handlers import persistent  # pylint: disable=E0401
@@ -25,6 +22,10 @@ from . import components
 from . import operators
 from . import component_base
 from . import export
+from . import cache
+from . import gltf
+from . import compression
+from . import prefabs
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +62,9 @@ def register():
     bpy.utils.register_class(ExportBevy)
 
     bpy.app.handlers.load_post.append(load_handler)
+    bpy.app.handlers.depsgraph_update_post.append(cache.depsgraph_update_handler)
+    bpy.app.handlers.undo_post.append(cache.invalidate_handler)
+    bpy.app.handlers.redo_post.append(cache.invalidate_handler)
 
     bpy.types.TOPBAR_MT_file_export.append(menu_func)
     logger.info(jdict(event="registering_bevy_addon", state="end"))
@@ -77,6 +81,9 @@ def unregister():
 
     bpy.types.TOPBAR_MT_file_export.remove(menu_func)
     bpy.app.handlers.load_post.remove(load_handler)
+    bpy.app.handlers.depsgraph_update_post.remove(cache.depsgraph_update_handler)
+    bpy.app.handlers.undo_post.remove(cache.invalidate_handler)
+    bpy.app.handlers.redo_post.remove(cache.invalidate_handler)
 
     for component in component_base.COMPONENTS:
         logger.info(jdict(event="unregistering_component",
@@ -88,6 +95,8 @@ def unregister():
 @persistent
 def load_handler(_dummy):
     """Scan the folder of the blend file for components to add"""
+    cache.ENTITY_CACHE.clear()
+
     for component in component_base.COMPONENTS:
         component.unregister()
 
@@ -243,80 +252,172 @@ class ExportBevy(bpy.types.Operator, ExportHelper):
         default=False
     )
 
+    gltf_workers: IntProperty(
+        name="GLTF Workers",
+        description="Number of background blender processes to export GLTF files "
+                    "with. 1 exports them in this blender, 0 uses one per CPU",
+        default=1,
+        min=0,
+    )
+
+    encode_workers: IntProperty(
+        name="Encode Workers",
+        description="Number of processes to encode the scene file with. "
+                    "1 encodes it in blender, 0 uses one per CPU. "
+                    "Only on Linux",
+        default=1,
+        min=0,
+    )
+
+    pipeline: BoolProperty(
+        name="Pipelined Export",
+        description="Read objects from blender, encode them and write the scene "
+                    "file at the same time, on separate threads. Always used "
+                    "with more than one encode worker",
+        default=False,
+    )
+
+    float_precision: EnumProperty(
+        name="Float Precision",
+        items=(
+            ("f64", "f64", "Write floats with full double precision"),
+            ("f32", "f32", "Write the shortest text that gives the same single "
+                           "precision float. Smaller files, slower to export"),
+        ),
+        description="How precisely floats are written to the scene file",
+        default="f64",
+    )
+
+    output_format: EnumProperty(
+        name="Scene Format",
+        items=(
+            ("ron", "RON", "Write the scene as RON text that bevy can load"),
+            ("binary", "Binary", "Write the scene in the compact binary format "
+                                 "of rust_types/binary.py. Not cached and "
+                                 "always encoded on one thread"),
+        ),
+        description="Format of the scene file",
+        default="ron",
+    )
+
+    compression: EnumProperty(
+        name="Compression",
+        items=[("none", "None", "Write the scene file uncompressed")] + [
+            (name, name, f"Compress the scene file with {name} (adds "
+                         f"{codec.extension} to the file name)")
+            for name, codec in compression.CODECS.items()
+        ],
+        description="Compress the scene file while it is written",
+        default="none",
+    )
+
+    export_prefabs: BoolProperty(
+        name="Export Prefabs",
+        description="Export each instanced collection once as a prefab scene, "
+                    "which the objects instancing it reference",
+        default=True,
+    )
+
+    export_instances: BoolProperty(
+        name="Export Instances",
+        description="Export the instances generated by geometry nodes and "
+                    "particle systems as one buffer of transforms per mesh",
+        default=True,
+    )
+
+    chunk_size: FloatProperty(
+        name="Cell Size",
+        description="Split the scene into a grid of cells this size, each "
+                    "written to its own scene file, with an index file "
+                    "listing them. 0 writes a single scene file",
+        default=0.0,
+        min=0.0,
+        unit="LENGTH",
+    )
+
+    clear_cache: BoolProperty(
+        name="Clear Cache",
+        description="Discard the export cache stored next to the scene file and "
+                    "export everything from scratch",
+        default=False,
+    )
+
     def execute(self, context):
         """Begin the export"""
 
         if not self.filepath:
             raise Exception("filepath not set")
 
-        do_export(
-            {
-                "output_filepath": self.filepath,
-                "mesh_output_folder": "meshes",
-                "material_output_folder": "materials",
-                "texture_output_folder": "textures",
-                "make_duplicates_real": False,
-            }
-        )
+        config = {
+            "output_filepath": self.filepath,
+            "mesh_output_folder": "meshes",
+            "material_output_folder": "materials",
+            "texture_output_folder": "textures",
+            "prefab_output_folder": "prefabs",
+            "make_duplicates_real": False,
+            "export_prefabs": self.export_prefabs,
+            "instance_output_folder": "instances",
+            "export_instances": self.export_instances,
+            "chunk_output_folder": "cells",
+            "chunk_size": self.chunk_size,
+            "clear_cache": self.clear_cache,
+            "mesh_extension": ".glb" if self.batch_export_format == "GLB" else ".gltf",
+            "gltf_apply_modifiers": self.batch_export_apply,
+            "gltf_workers": self.gltf_workers,
+            "float_precision": self.float_precision,
+            "encode_workers": self.encode_workers,
+            "pipeline": self.pipeline,
+            "output_format": self.output_format,
+            "compression": self.compression,
+        }
+        report = do_export(config)
+        if "cache_hits" in report:
+            self.report(
+                {"INFO"},
+                f"Exported {report['entities']} entities "
+                f"({report['cache_hits']} cached, {report['cache_misses']} encoded)",
+            )
 
         # Blender GLTF Exporter
         if self.export_gltf:
-            # get the folder
-            folder_path = os.path.dirname(self.filepath)
-
-            # get objects selected in the viewport
-            viewport_selection = context.selected_objects
-            obj_export_list = [i for i in context.scene.objects]
-
-            # deselect all objects
-            bpy.ops.object.select_all(action='DESELECT')
-
-            for item in obj_export_list:
-                item.select_set(True)
-                # if item.type == 'MESH':
-                file_path = os.path.join(folder_path, f"{item.name}")
-
-                # Store original object transform
-                store_location = copy.deepcopy(item.location)
-                store_rotation = copy.deepcopy(item.rotation_quaternion)
-                store_scale = copy.deepcopy(item.scale)
-
-                item.location = [0.0, 0.0, 0.0]
-                item.rotation_quaternion = [1.0, 0.0, 0.0, 0.0]
-                item.scale = [1.0, 1.0, 1.0]
-
-                bpy.ops.export_scene.gltf(
-                    filepath=file_path,
-                    use_selection=self.batch_export_selection,
-                    export_format=self.batch_export_format,
-                    export_copyright=self.batch_export_copyright,
-                    export_image_format=self.batch_export_image_format,
-                    export_materials=self.batch_export_materials,
-                    export_colors=self.batch_export_colors,
-                    export_cameras=self.batch_export_cameras,
-                    export_extras=self.batch_export_extras,
-                    export_yup=self.batch_export_yup,
-                    export_apply=self.batch_export_apply,
-                    export_texcoords=self.batch_export_texcoords,
-                    export_normals=self.batch_export_normals,
-                    export_tangents=self.batch_export_tangents,
+            objects = list(context.scene.objects)
+            # The objects in prefabs, and the objects that were instanced,
+            # may not be in the scene
+            others = config.get("instance_sources", [])
+            if self.export_prefabs:
+                others = prefabs.prefab_objects(objects) + others
+            objects = list(dict.fromkeys(objects + others))
+            errors = gltf.export_meshes(config, objects, self.gltf_options())
+            if errors:
+                self.report(
+                    {"ERROR"},
+                    f"Failed to export {len(errors)} GLTF files: " + "; ".join(errors),
                 )
-
-                item.select_set(False)
-
-                # Restore object transform
-                item.location = store_location
-                item.rotation_quaternion = store_rotation
-                item.scale = store_scale
-
-            # restore viewport selection
-            for ob in viewport_selection:
-                ob.select_set(True)
+                return {"CANCELLED"}
 
         return {"FINISHED"}
 
+    def gltf_options(self):
+        """The arguments to pass to blenders GLTF exporter"""
+        return {
+            "use_selection": self.batch_export_selection,
+            "export_format": self.batch_export_format,
+            "export_copyright": self.batch_export_copyright,
+            "export_image_format": self.batch_export_image_format,
+            "export_materials": self.batch_export_materials,
+            "export_colors": self.batch_export_colors,
+            "export_cameras": self.batch_export_cameras,
+            "export_extras": self.batch_export_extras,
+            "export_yup": self.batch_export_yup,
+            "export_apply": self.batch_export_apply,
+            "export_texcoords": self.batch_export_texcoords,
+            "export_normals": self.batch_export_normals,
+            "export_tangents": self.batch_export_tangents,
+        }
+
 
 def do_export(config):
     """Start the export. This is a global function to ensure it can be called
-    both from the operator and from external scripts"""
-    export.export_all(config)
+    both from the operator and from external scripts. Returns a dict
+    of statistics about the export"""
+    return export.export_all(config)
@@ -0,0 +1,441 @@
+""" Keeps the encoded form of each entity between exports so that objects
+that have not changed since the last export do not need to be encoded again.
+
+Each cached entity is stored with a fingerprint of everything that goes into
+encoding it (transform, data-block, component properties). Blender's depsgraph
+tells us which objects have been modified since the last export, so objects
+that are not dirty can skip even the fingerprint computation.
+
+The in-memory cache is backed by a DiskCache stored in a folder next to the
+exported scene, so that exports stay incremental after blender is restarted.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import bpy
+from bpy.app.handlers import persistent  # pylint: disable=E0401
+
+from . import component_base
+from .rust_types import ron
+
+
+class CacheEntry:
+    """The encoded text for an entity and the things it was computed from"""
+
+    def __init__(self, identity, fingerprint, text):
+        self.identity = identity
+        self.fingerprint = fingerprint
+        self.text = text
+
+
+class EntityCache:
+    """Cache of encoded entities, keyed by object name"""
+
+    def __init__(self):
+        self.entries = {}
+        self.settings = None
+        self.disk = None
+
+        # Names of objects (and (type, name) of data-blocks) modified since
+        # the last export. This is only complete if tracking is True, meaning
+        # that the depsgraph handler has been running the whole time
+        self.dirty_objects = set()
+        self.dirty_data = set()
+        self.tracking = False
+
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Forget everything that was cached"""
+        self.entries = {}
+        self.dirty_objects = set()
+        self.dirty_data = set()
+        self.tracking = False
+
+    def begin_export(self, config, disk=None):
+        """Reset the counters, and drop cached entries if the export settings
+        have changed in a way that may alter the encoded output. Entities not
+        in memory are looked for in the (optional) disk cache"""
+        settings = export_settings(config)
+        if settings != self.settings:
+            self.clear()
+            self.settings = settings
+        self.disk = disk
+        if disk is not None:
+            disk.begin_export(settings)
+        self.hits = 0
+        self.misses = 0
+
+    def end_export(self):
+        """Everything has been re-encoded, so nothing is dirty anymore. From
+        now on the depsgraph handler is responsible for marking changes"""
+        self.dirty_objects = set()
+        self.dirty_data = set()
+        self.tracking = depsgraph_update_handler in bpy.app.handlers.depsgraph_update_post
+        if self.disk is not None:
+            self.disk.end_export()
+            self.disk = None
+
+    def is_dirty(self, obj):
+        """Returns true if the object may have changed since the last export"""
+        if not self.tracking or obj.name_full in self.dirty_objects:
+            return True
+        return obj.data is not None and data_key(obj.data) in self.dirty_data
+
+    def get(self, config, obj, entity_id):
+        """Returns the cached text for this object, or None if it needs to be
+        encoded again. Also returns the identity and fingerprint to store the
+        newly encoded text under."""
+        identity = entity_identity(config, obj, entity_id)
+        entry = self.entries.get(obj.name_full)
+
+        if entry is not None and entry.identity == identity and not self.is_dirty(obj):
+            self.hits += 1
+            if self.disk is not None:
+                self.disk.touch_entity(entry.fingerprint)
+            return entry.text, identity, entry.fingerprint
+
+        fingerprint = object_fingerprint(obj, identity)
+        if entry is not None and entry.fingerprint == fingerprint:
+            self.hits += 1
+            if self.disk is not None:
+                self.disk.touch_entity(fingerprint)
+            return entry.text, identity, fingerprint
+
+        if self.disk is not None:
+            text = self.disk.get_entity(fingerprint)
+            if text is not None:
+                self.hits += 1
+                self.entries[obj.name_full] = CacheEntry(identity, fingerprint, text)
+                return text, identity, fingerprint
+
+        self.misses += 1
+        return None, identity, fingerprint
+
+    def put(self, name, identity, fingerprint, text):
+        """Store the encoded text for the object with this full name. This
+        doesn't use bpy, so it can be called from any thread"""
+        self.entries[name] = CacheEntry(identity, fingerprint, text)
+        if self.disk is not None:
+            self.disk.put_entity(fingerprint, text)
+
+    def mark_updates(self, depsgraph):
+        """Record the objects and data-blocks the depsgraph says have changed"""
+        for update in depsgraph.updates:
+            id_data = update.id.original
+            if isinstance(id_data, bpy.types.Object):
+                self.dirty_objects.add(id_data.name_full)
+            else:
+                self.dirty_data.add(data_key(id_data))
+
+    def report(self):
+        """Hit/miss counts from the most recent export"""
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+
+ENTITY_CACHE = EntityCache()
+
+
+class DiskCache:
+    """Stores encoded entities and hashes of exported files in a folder so
+    that they survive restarting blender. Each blend file gets its own
+    sub-folder. Entity files are evicted least-recently-used first once the
+    folder grows beyond max_bytes. The size and last use of each entity file
+    are kept in the "entities" manifest, so that eviction doesn't have to
+    look at the files themselves"""
+
+    FOLDER_NAME = ".bevy_export_cache"
+
+    def __init__(self, output_folder, blend_filepath, max_bytes):
+        blend_key = hashlib.sha1(blend_filepath.encode("utf-8")).hexdigest()[:16]
+        self.folder = os.path.join(output_folder, self.FOLDER_NAME, blend_key)
+        self.max_bytes = max_bytes
+        self.settings_key = ""
+        self.export_time = 0.0
+        self._manifests = {}
+
+    def clear(self):
+        """Remove everything stored for this blend file"""
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self._manifests = {}
+
+    def begin_export(self, settings):
+        """Encoded entities are only valid for the settings they were
+        encoded with"""
+        self.settings_key = hashlib.sha1(repr(settings).encode("utf-8")).hexdigest()
+        self.export_time = time.time()
+
+    def end_export(self):
+        """Trim the cache down to size and write out the manifests"""
+        self.evict()
+        self.save_manifests()
+
+    def _entity_key(self, fingerprint):
+        return hashlib.sha1((self.settings_key + fingerprint).encode("utf-8")).hexdigest()
+
+    def _entity_path(self, key):
+        return os.path.join(self.folder, "entities", key[:2], key[2:] + ".ron")
+
+    def get_entity(self, fingerprint):
+        """Returns the cached text for this fingerprint or None"""
+        key = self._entity_key(fingerprint)
+        try:
+            with open(self._entity_path(key), encoding="utf-8") as cached:
+                text = cached.read()
+        except FileNotFoundError:
+            return None
+        self.manifest("entities")[key] = [len(text.encode("utf-8")), self.export_time]
+        return text
+
+    def touch_entity(self, fingerprint):
+        """Record that the entity for this fingerprint is still in use (eg
+        it was found in memory), so that it isn't evicted before entities
+        that are no longer used"""
+        entry = self.manifest("entities").get(self._entity_key(fingerprint))
+        if entry is not None:
+            entry[1] = self.export_time
+
+    def put_entity(self, fingerprint, text):
+        """Store the encoded text for this fingerprint"""
+        key = self._entity_key(fingerprint)
+        path = self._entity_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as cached:
+            cached.write(text)
+        self.manifest("entities")[key] = [len(text.encode("utf-8")), self.export_time]
+
+    def evict(self):
+        """Delete the least recently used entity files until the cache is no
+        larger than max_bytes"""
+        entities = self.manifest("entities")
+        total = sum(size for size, _last_used in entities.values())
+        if total <= self.max_bytes:
+            return
+
+        for key, (size, _last_used) in sorted(
+            entities.items(), key=lambda item: item[1][1]
+        ):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entity_path(key))
+            except FileNotFoundError:
+                pass
+            del entities[key]
+            total -= size
+
+    def manifest(self, name):
+        """A dict stored as JSON in the cache folder (eg "files" maps the
+        path of each exported file to the hash of its contents). It is loaded
+        on first use and written back at the end of the export"""
+        if name not in self._manifests:
+            try:
+                with open(
+                    os.path.join(self.folder, name + ".json"), encoding="utf-8"
+                ) as manifest:
+                    self._manifests[name] = json.load(manifest)
+            except (FileNotFoundError, json.decoder.JSONDecodeError):
+                self._manifests[name] = {}
+        return self._manifests[name]
+
+    def save_manifests(self):
+        """Write out the manifests that have been used"""
+        if not self._manifests:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        for name, contents in self._manifests.items():
+            with open(
+                os.path.join(self.folder, name + ".json"), "w", encoding="utf-8"
+            ) as manifest:
+                json.dump(contents, manifest, indent=1, sort_keys=True)
+
+
+def disk_cache(config):
+    """Returns the DiskCache for this export, or None if it is disabled.
+    If the config asks for it, the existing cache is cleared first"""
+    if not config.get("use_disk_cache", True):
+        return None
+
+    disk = DiskCache(
+        os.path.dirname(config["output_filepath"]),
+        bpy.data.filepath or "untitled",
+        config.get("cache_max_bytes", 256 * 1024 * 1024),
+    )
+    if config.get("clear_cache", False):
+        disk.clear()
+    return disk
+
+
+def hash_file(path):
+    """sha1 of a files contents"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as data:
+        for chunk in iter(lambda: data.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@persistent
+def depsgraph_update_handler(_scene, depsgraph):
+    """Marks changed objects in the entity cache as dirty"""
+    ENTITY_CACHE.mark_updates(depsgraph)
+
+
+@persistent
+def invalidate_handler(_dummy):
+    """Loading a file or stepping through the undo history replaces blender's
+    data without reliably reporting what changed, so we can no longer trust
+    dirty tracking"""
+    ENTITY_CACHE.tracking = False
+
+
+def data_key(id_data):
+    """Names are only unique within one kind of data-block"""
+    return (type(id_data).__name__, id_data.name_full)
+
+
+# Config keys that control the cache itself (or how the work is spread out)
+# rather than the output
+CACHE_CONFIG_KEYS = (
+    "use_cache",
+    "use_disk_cache",
+    "clear_cache",
+    "cache_max_bytes",
+    "gltf_workers",
+    "encode_workers",
+    "pipeline",
+    "compression",
+    "compression_level",
+)
+
+
+def export_settings(config):
+    """The parts of the export configuration (and of the RON encoder setup)
+    that change how an entity is encoded"""
+    return (
+        tuple(
+            sorted(
+                (k, v)
+                for k, v in config.items()
+                if isinstance(v, (str, int, float, bool, type(None)))
+                and k not in CACHE_CONFIG_KEYS
+            )
+        ),
+        tuple(c.__name__ for c in component_base.COMPONENTS),
+        ron.INDENT_SIZE,
+        ron.INDENT_CHAR,
+        ron.FLOAT_PRECISION,
+    )
+
+
+def entity_identity(config, obj, entity_id):
+    """The cheap-to-compute things that an entity's encoding depends on that
+    are not part of the object itself"""
+    entity_ids = config["entity_ids"]
+    parent_id = entity_ids.get(obj.parent) if obj.parent else None
+    children = config.get("children", {}).get(obj, ())
+    return (entity_id, parent_id, tuple(entity_ids[c] for c in children))
+
+
+# Properties that are blender's bookkeeping or UI state rather than anything
+# that is exported. They change between sessions (session_uid), with other
+# users of the same data (users, tag) or with what is selected or edited, so
+# they are left out of fingerprints that are kept on disk
+RUNTIME_PROPERTIES = frozenset(
+    (
+        # Every data-block (bpy.types.ID) has these
+        "id_type",
+        "session_uid",
+        "is_evaluated",
+        "users",
+        "use_fake_user",
+        "use_extra_user",
+        "is_embedded_data",
+        "is_linked_packed",
+        "is_missing",
+        "is_runtime_data",
+        "is_editable",
+        "tag",
+        "is_library_indirect",
+        # Selection and edit mode
+        "select",
+        "mode",
+        "is_editmode",
+        "total_vert_sel",
+        "total_edge_sel",
+        "total_face_sel",
+    )
+)
+
+# How nodes are drawn in the node editor
+NODE_UI_PROPERTIES = frozenset(
+    (
+        "location",
+        "location_absolute",
+        "width",
+        "height",
+        "dimensions",
+        "label",
+        "hide",
+        "show_options",
+        "show_preview",
+        "show_texture",
+        "use_custom_color",
+        "color",
+        "color_tag",
+        "warning_propagation",
+    )
+)
+
+
+def rna_values(struct):
+    """Collect the values of all the simple (non-pointer) properties of a
+    blender struct, except the RUNTIME_PROPERTIES (and NODE_UI_PROPERTIES of
+    nodes)"""
+    skipped = RUNTIME_PROPERTIES
+    if isinstance(struct, bpy.types.Node):
+        skipped = RUNTIME_PROPERTIES | NODE_UI_PROPERTIES
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.type in ("POINTER", "COLLECTION") or prop.identifier in skipped:
+            continue
+        try:
+            value = getattr(struct, prop.identifier)
+        except AttributeError:
+            continue
+        if getattr(prop, "is_array", False):
+            # Matrices come out as sequences of vectors
+            value = tuple(
+                tuple(v) if hasattr(v, "__len__") else v for v in value
+            )
+        values.append((prop.identifier, value))
+    return values
+
+
+def object_fingerprint(obj, identity):
+    """Hash of everything that the encoding of an object can depend on"""
+    parts = [identity, obj.type, rna_values(obj)]
+
+    if obj.data is not None:
+        parts.append(data_key(obj.data))
+        parts.append(rna_values(obj.data))
+
+    # The prefab a PrefabInstance references, and the modifiers that the
+    # GLTF file name depends on when they are applied
+    if obj.instance_collection is not None:
+        parts.append(obj.instance_collection.name_full)
+    parts.append([(m.type, m.name, rna_values(m)) for m in obj.modifiers])
+
+    # Component settings are stored in property groups on the object
+    for prop in obj.bl_rna.properties:
+        if prop.type != "POINTER":
+            continue
+        group = getattr(obj, prop.identifier, None)
+        if isinstance(group, bpy.types.PropertyGroup):
+            parts.append((prop.identifier, rna_values(group)))
+
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
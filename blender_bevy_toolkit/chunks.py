@@ -0,0 +1,147 @@
+""" Splits the scene into a grid of cells that can be streamed in separately.
+
+With config["chunk_size"] set, the entities are partitioned into a uniform
+grid of cells of that size on blender's ground plane (X and Y), and each
+cell is written to its own scene file in config["chunk_output_folder"].
+A cell spans all heights, as levels are usually streamed by the distance
+along the ground.
+
+A hierarchy is never split: each object goes in the cell of the root of its
+hierarchy, so Parent and Children only reference entities in the same file.
+The bounds recorded for a cell are those of what it actually contains,
+which can extend past the cell when children are far from their root.
+
+Every scene file references meshes, prefabs and instance buffers relative to
+itself (see utils.scene_path). The cell files are in a subfolder, so these
+paths start with "../" (eg "../meshes/Cube_c67f7e59.glb").
+
+An index file is written next to the scene file, listing each cell:
+
+```
+(
+    cell_size: 64.0,
+    cells: [
+        (
+            cell: (0, -1),
+            min: (0.5, -2.0, 10.25),
+            max: (63.0, 8.0, 60.0),
+            file: "cells/level_0_-1.scn",
+            entities: 120,
+        ),
+    ],
+)
+```
+
+The bounds are in bevy's (Y-up) coordinates.
+"""
+import os
+import math
+import mathutils
+
+from . import compression, gltf, rust_types
+
+
+class Cell:
+    """The objects and instance buffers (instances.WrittenBuffer) in one cell
+    of the grid, and the world space bounds (in blender's coordinates) of
+    what they contain"""
+
+    def __init__(self, key):
+        self.key = key
+        self.objects = []
+        self.buffers = []
+        self.minimum = None
+        self.maximum = None
+
+    def include(self, minimum, maximum):
+        """Grow the bounds to include a box"""
+        if self.minimum is None:
+            self.minimum, self.maximum = list(minimum), list(maximum)
+            return
+        for axis in range(3):
+            self.minimum[axis] = min(self.minimum[axis], minimum[axis])
+            self.maximum[axis] = max(self.maximum[axis], maximum[axis])
+
+
+def cell_key(location, size):
+    """The (x, y) grid cell containing a point"""
+    return (math.floor(location[0] / size), math.floor(location[1] / size))
+
+
+def object_bounds(obj):
+    """The world space bounding box of an object: the corners of its
+    geometry's bounding box, or its origin if it has no geometry"""
+    matrix = obj.matrix_world
+    if not gltf.has_asset(obj):
+        location = tuple(matrix.translation)
+        return location, location
+    corners = [matrix @ mathutils.Vector(corner) for corner in obj.bound_box]
+    return (
+        tuple(min(c[axis] for c in corners) for axis in range(3)),
+        tuple(max(c[axis] for c in corners) for axis in range(3)),
+    )
+
+
+def partition(objects, size):
+    """Assign each object to a cell. The objects must be sorted parents
+    first (see export.build_hierarchy). Returns a dict of key -> Cell"""
+    cells = {}
+    object_cells = {}
+    for obj in objects:
+        # Children go in the cell of their parent, and so of their root
+        cell = object_cells.get(obj.parent)
+        if cell is None:
+            key = cell_key(obj.matrix_world.translation, size)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = Cell(key)
+        object_cells[obj] = cell
+        cell.objects.append(obj)
+        cell.include(*object_bounds(obj))
+    return cells
+
+
+def cell_file(config, key):
+    """The path of the scene file of a cell, relative to the scene file"""
+    stem, extension = os.path.splitext(os.path.basename(config["output_filepath"]))
+    filename = f"{stem}_{key[0]}_{key[1]}{extension or '.scn'}"
+    codec = compression.get_codec(config)
+    if codec is not None:
+        filename += codec.extension
+    return f"{config.get('chunk_output_folder', 'cells')}/{filename}"
+
+
+def index_path(config):
+    """Where the index of the cells is written"""
+    return os.path.splitext(config["output_filepath"])[0] + ".index.ron"
+
+
+def _bevy_bounds(minimum, maximum):
+    # Z-up to Y-up, where blender's -Y is bevy's Z
+    return (
+        rust_types.ron.Tuple(minimum[0], minimum[2], -maximum[1]),
+        rust_types.ron.Tuple(maximum[0], maximum[2], -minimum[1]),
+    )
+
+
+def write_index(config, cells):
+    """Write the index file listing the cells"""
+    entries = []
+    for key in sorted(cells):
+        cell = cells[key]
+        minimum, maximum = _bevy_bounds(cell.minimum, cell.maximum)
+        entries.append(
+            rust_types.ron.Struct(
+                cell=rust_types.ron.Tuple(*key),
+                min=minimum,
+                max=maximum,
+                file=cell_file(config, key),
+                entities=len(cell.objects) + len(cell.buffers),
+            )
+        )
+    index = rust_types.ron.Struct(
+        cell_size=float(config["chunk_size"]),
+        cells=rust_types.ron.List(*entries),
+    )
+    with open(index_path(config), "w", encoding="utf-8") as outfile:
+        rust_types.ron.encode_to(outfile, index)
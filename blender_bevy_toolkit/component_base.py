@@ -7,10 +7,22 @@ from . import rust_types
 class ComponentBase(metaclass=ABCMeta):
     """All components need to implement this base class to work with the exporter"""
 
+    # The blender object types (eg {"LIGHT"}) that this component can ever be
+    # present on. The exporter only calls is_present for objects of these
+    # types. None means that the component may be present on any object.
+    object_types = None
+
+    # Set to True if the encoded component is likely to be identical for
+    # many objects (eg no fields, or settings that are rarely changed). The
+    # exporter then encodes each distinct value only once (see ron.intern)
+    interned = False
+
     @staticmethod
     @abstractmethod
     def encode(config, obj):
-        """Returns a Component representing this component"""
+        """Returns a Component representing this component. Components
+        whose presence depends on the export (eg Children, which needs the
+        hierarchy built by the exporter) can return None to be left out"""
         return rust_types.Map(
             type="mycrate::mymodule::MyStruct",
             struct=rust_types.Map(),
@@ -72,3 +84,15 @@ def register_component(cls):
     COMPONENTS.append(cls)
     COMPONENTS.sort(key=lambda c: c.__name__)
     return cls
+
+
+def components_for_object_type(object_type, components=None):
+    """Returns the components (in registration order) that may be present
+    on an object of the supplied blender type (eg "MESH")."""
+    if components is None:
+        components = COMPONENTS
+    return [
+        c
+        for c in components
+        if getattr(c, "object_types", None) is None or object_type in c.object_types
+    ]
@@ -107,9 +107,39 @@ def create_ui_panel(component_def, component_class, fields):
     return panel
 
 
-# pylint: disable=too-many-arguments
+def create_template(component_def):
+    """Compile the shape of the encoded component into a template, with a
+    slot for each field. Returns the template and a dict of field name to
+    the function that converts the blender value into the slot value"""
+    shape = {}
+    fillers = {}
+    for field in component_def.fields:
+        encoder = TYPE_ENCODERS[field.type]
+        # Reflected types keep their type header in the template and only
+        # the processed value goes in the slot
+        process = getattr(encoder, "process", None)
+        if process is None:
+            shape[field.field] = rust_types.Slot(field.field)
+            fillers[field.field] = encoder
+        else:
+            shape[field.field] = encoder(rust_types.Slot(field.field))
+            fillers[field.field] = process
+
+    template = rust_types.Template(
+        rust_types.Map(type=component_def.struct, struct=rust_types.Map(**shape))
+    )
+    return template, fillers
+
+
+# pylint: disable=too-many-arguments,too-many-locals
 def insert_class_methods(
-    component_class, component_def, panel, properties, fields, is_present_function=None
+    component_class,
+    component_def,
+    panel,
+    properties,
+    fields,
+    is_present_function=None,
+    use_template=False,
 ):
     """The class representing this component needs some functions (eg to detect if
     the component exists on a blender object). These functions are generated and
@@ -132,6 +162,16 @@ def insert_class_methods(
     def remove(obj):
         getattr(obj, component_def.id).present = False
 
+    if use_template:
+        template, fillers = create_template(component_def)
+
+    def encode_template(_config, obj):
+        """Returns the component by filling in the compiled template"""
+        component_data = getattr(obj, component_def.id)
+        return template.fill(
+            **{f: fill(getattr(component_data, f)) for f, fill in fillers.items()}
+        )
+
     def encode(_config, obj):
         """Returns a Component representing this component"""
         component_data = getattr(obj, component_def.id)
@@ -154,7 +194,7 @@ def insert_class_methods(
     component_class.register = staticmethod(register)
     component_class.unregister = staticmethod(unregister)
     component_class.remove = staticmethod(remove)
-    component_class.encode = staticmethod(encode)
+    component_class.encode = staticmethod(encode_template if use_template else encode)
 
     if is_present_function is None:
 
@@ -206,7 +246,13 @@ def create_fields(component_def):
     return fields
 
 
-def component_from_def(component_def, is_present_function=None):
+def component_from_def(
+    component_def,
+    is_present_function=None,
+    object_types=None,
+    use_template=False,
+    interned=False,
+):
     """Create a class that stores all the internals of the properties in
     a blender-compatible way.
 
@@ -217,6 +263,13 @@ def component_from_def(component_def, is_present_function=None):
     of if the component is present. If this function does not exist, then the
     user has to add the component manually. If a function is provided then it is
     executed to determine if the component is present in an object.
+
+    The third parameter optionally restricts the blender object types that the
+    exporter will check this component against (see ComponentBase.object_types)
+
+    If use_template is set, the shape of the encoded component is compiled
+    once into a rust_types.Template, and encoding an object only fills in
+    the field values. interned is passed through to ComponentBase.interned
     """
     logging.debug(
         jdict(
@@ -235,7 +288,7 @@ def component_from_def(component_def, is_present_function=None):
     component_class = type(
         component_def.name,
         (),
-        {},
+        {"object_types": object_types, "interned": interned},
     )
 
     panel = create_ui_panel(component_def, component_class, fields)
@@ -247,6 +300,7 @@ def component_from_def(component_def, is_present_function=None):
         properties,
         fields,
         is_present_function=is_present_function,
+        use_template=use_template,
     )
     abc.ABCMeta.register(ComponentBase, component_class)
 
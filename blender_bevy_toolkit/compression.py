@@ -0,0 +1,245 @@
+""" Optionally compresses the scene file as it is written.
+
+Each codec wraps the output file in a writer that compresses whatever is
+written to it straight away, so the scene is compressed chunk by chunk as it
+is encoded rather than from a finished string. gzip and zlib come from the
+standard library, and zstd is available if the zstandard package is
+installed. Other codecs can be added with register_codec.
+
+Files can be read back with open_input, which recognises the codec a file
+was written with from its extension or first bytes (eg to compare two
+exports).
+"""
+import io
+import gzip
+import zlib
+import contextlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# How much compressed data to read at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ZlibWriter(io.BufferedIOBase):
+    """Writes a zlib stream to a binary file"""
+
+    def __init__(self, fileobj, level):
+        super().__init__()
+        self.fileobj = fileobj
+        self.compressor = zlib.compressobj(level)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.fileobj.write(self.compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.fileobj.write(self.compressor.flush())
+        super().close()
+
+
+class ZlibReader(io.RawIOBase):
+    """Reads a zlib stream from a binary file"""
+
+    def __init__(self, fileobj):
+        super().__init__()
+        self.fileobj = fileobj
+        self.decompressor = zlib.decompressobj()
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            if self.decompressor.eof:
+                return 0
+            data = self.decompressor.unconsumed_tail or self.fileobj.read(
+                READ_CHUNK_SIZE
+            )
+            if not data:
+                raise EOFError("The zlib stream ended early")
+            self.pending = self.decompressor.decompress(data, len(buffer))
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def open_gzip(fileobj, level):
+    """Gzip, as read by gunzip and most HTTP servers"""
+    return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=level)
+
+
+def open_zlib(fileobj, level):
+    """A bare zlib stream, without the gzip header"""
+    return ZlibWriter(fileobj, level)
+
+
+def open_zstd(fileobj, level):
+    """Zstandard: faster than gzip for a similar size"""
+    return zstandard.ZstdCompressor(level=level).stream_writer(
+        fileobj, closefd=False
+    )
+
+
+def read_gzip(fileobj):
+    """Reads what open_gzip wrote"""
+    return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+
+def read_zlib(fileobj):
+    """Reads what open_zlib wrote"""
+    return io.BufferedReader(ZlibReader(fileobj))
+
+
+def read_zstd(fileobj):
+    """Reads what open_zstd wrote"""
+    return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+
+
+def is_gzip(header):
+    """Returns true if a file starts with the gzip magic number"""
+    return header[:2] == b"\x1f\x8b"
+
+
+def is_zlib(header):
+    """zlib has no magic number, but open_zlib always starts with 0x78 (a
+    32KB window) and the two byte header has a check"""
+    return len(header) >= 2 and header[0] == 0x78 and (0x7800 | header[1]) % 31 == 0
+
+
+def is_zstd(header):
+    """Returns true if a file starts with the zstd magic number"""
+    return header[:4] == b"\x28\xb5\x2f\xfd"
+
+
+class Codec:
+    """How to compress a file: a function that wraps a binary file object in
+    a compressing writer (given the file and a compression level), the
+    extension added to the file name and the default level. Optionally, how
+    to read it back: a function that wraps a binary file object in a
+    decompressing reader, and one that recognises the first bytes of a
+    compressed file"""
+
+    def __init__(
+        self, open_writer, extension, default_level, open_reader=None, matches=None
+    ):
+        self.open_writer = open_writer
+        self.extension = extension
+        self.default_level = default_level
+        self.open_reader = open_reader
+        self.matches = matches
+
+
+# Maps the config["compression"] name -> Codec
+CODECS = {}
+
+
+def register_codec(
+    name, open_writer, extension, default_level, open_reader=None, matches=None
+):
+    """Make a codec available as config["compression"] = name"""
+    CODECS[name] = Codec(open_writer, extension, default_level, open_reader, matches)
+
+
+register_codec("gzip", open_gzip, ".gz", 6, read_gzip, is_gzip)
+register_codec("zlib", open_zlib, ".zz", 6, read_zlib, is_zlib)
+if zstandard is not None:
+    register_codec("zstd", open_zstd, ".zst", 3, read_zstd, is_zstd)
+
+
+def output_path(config):
+    """The path the scene is written to: the output file plus the extension
+    of the codec it is compressed with"""
+    path = config["output_filepath"]
+    codec = get_codec(config)
+    if codec is not None and not path.endswith(codec.extension):
+        path += codec.extension
+    return path
+
+
+def get_codec(config):
+    """The Codec for config["compression"], or None to not compress"""
+    name = config.get("compression") or "none"
+    if name == "none":
+        return None
+    if name not in CODECS:
+        raise ValueError(
+            f"Unknown compression {name}, expected one of "
+            + ", ".join(["none"] + list(CODECS))
+        )
+    return CODECS[name]
+
+
+@contextlib.contextmanager
+def open_output(config, binary=False, buffering=-1):
+    """Open the scene file for writing, compressed with config["compression"]
+    at config["compression_level"] (or the codec's default level). Yields a
+    text file, or a binary one if binary is True"""
+    codec = get_codec(config)
+    if codec is None:
+        if binary:
+            with open(output_path(config), "wb", buffering=buffering) as outfile:
+                yield outfile
+        else:
+            with open(
+                output_path(config), "w", encoding="utf-8", buffering=buffering
+            ) as outfile:
+                yield outfile
+        return
+
+    level = config.get("compression_level")
+    if level is None:
+        level = codec.default_level
+
+    with open(output_path(config), "wb", buffering=buffering) as rawfile:
+        writer = codec.open_writer(rawfile, level)
+        with contextlib.closing(writer):
+            if binary:
+                yield writer
+            else:
+                # Batches up small writes before they reach the compressor
+                text = io.TextIOWrapper(writer, encoding="utf-8")
+                try:
+                    yield text
+                finally:
+                    text.flush()
+                    text.detach()
+
+
+def detect_codec(path):
+    """The Codec a file was compressed with, from its extension or else its
+    first bytes. None if it isn't compressed (or was compressed with a codec
+    that can't be read)"""
+    for codec in CODECS.values():
+        if codec.open_reader is not None and path.endswith(codec.extension):
+            return codec
+    with open(path, "rb") as infile:
+        header = infile.read(4)
+    for codec in CODECS.values():
+        if codec.matches is not None and codec.matches(header):
+            return codec
+    return None
+
+
+@contextlib.contextmanager
+def open_input(path):
+    """Open a file written by open_output for reading, decompressing it
+    with the codec it was written with. Yields a binary file"""
+    codec = detect_codec(path)
+    with open(path, "rb") as rawfile:
+        if codec is None:
+            yield rawfile
+            return
+        reader = codec.open_reader(rawfile)
+        with contextlib.closing(reader):
+            yield reader
@@ -0,0 +1,46 @@
+from blender_bevy_toolkit.component_base import (
+    register_component,
+    ComponentBase,
+)
+from blender_bevy_toolkit import rust_types
+
+
+@register_component
+class Children(ComponentBase):
+    def encode(config, obj):
+        """Returns a Component representing this component, or None if the
+        object has no children. The children come from the hierarchy that
+        the exporter builds once for the whole scene, as obj.children
+        searches the whole scene for each object"""
+        children = config["children"].get(obj)
+        if not children:
+            return None
+
+        entity_ids = config["entity_ids"]
+        return rust_types.Map(
+            type="bevy_hierarchy::components::children::Children",
+            tuple_struct=rust_types.List(
+                rust_types.Map(
+                    type="smallvec::SmallVec<[bevy_ecs::entity::Entity; 8]>",
+                    list=rust_types.List(
+                        *(rust_types.Entity(entity_ids[c]) for c in children)
+                    ),
+                ),
+            ),
+        )
+
+    def is_present(obj):
+        """Any object can have children. Whether it does is only known
+        during an export, so encode leaves the component out if not"""
+        return True
+
+    def can_add(obj):
+        return False
+
+    @staticmethod
+    def register():
+        pass
+
+    @staticmethod
+    def unregister():
+        pass
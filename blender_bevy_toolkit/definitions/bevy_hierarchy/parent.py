@@ -9,10 +9,10 @@ from blender_bevy_toolkit import rust_types
 class Parent(ComponentBase):
     def encode(config, obj):
         """Returns a Component representing this component"""
-
-        collection_objs = list(config["scene"].objects)
-
-        parent_id = collection_objs.index(obj.parent)
+        parent_id = config["entity_ids"].get(obj.parent)
+        if parent_id is None:
+            # eg an object in a prefab whose parent is outside the collection
+            return None
 
         return rust_types.Map(
             type="bevy_hierarchy::components::parent::Parent",
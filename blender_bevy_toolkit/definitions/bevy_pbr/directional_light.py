@@ -18,6 +18,9 @@ logger = logging.getLogger(__name__)
 
 @register_component
 class DirectionalLight(ComponentBase):
+    object_types = {"LIGHT"}
+    interned = True
+
     @staticmethod
     def encode(config, obj):
         assert DirectionalLight.is_present(obj)
@@ -156,6 +159,9 @@ register_component(
             fields=[],
         ),
         is_present_function=DirectionalLight.is_present,
+        object_types=DirectionalLight.object_types,
+        use_template=True,
+        interned=True,
     )
 )
 
@@ -169,5 +175,8 @@ register_component(
             fields=[],
         ),
         is_present_function=DirectionalLight.is_present,
+        object_types=DirectionalLight.object_types,
+        use_template=True,
+        interned=True,
     )
 )
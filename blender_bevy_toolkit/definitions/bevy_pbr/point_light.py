@@ -12,11 +12,27 @@ from blender_bevy_toolkit.component_constructor import (
 
 import logging
 from blender_bevy_toolkit.utils import jdict
-from blender_bevy_toolkit.rust_types import F32, Bool, RgbaLinear, Map
+from blender_bevy_toolkit.rust_types import F32, Bool, RgbaLinear, Map, Slot, Template
 
 logger = logging.getLogger(__name__)
 
 
+POINT_LIGHT = Template(
+    Map(
+        type="bevy_pbr::light::PointLight",
+        struct=Map(
+            color=RgbaLinear(Slot("color")),
+            intensity=F32(Slot("intensity")),
+            range=F32(Slot("range")),
+            radius=F32(Slot("radius")),
+            shadows_enabled=Bool(Slot("shadows_enabled")),
+            shadow_depth_bias=F32(Slot("shadow_depth_bias")),
+            shadow_normal_bias=F32(Slot("shadow_normal_bias")),
+        ),
+    )
+)
+
+
 @register_component
 class PointLight(ComponentBase):
     """
@@ -60,23 +76,21 @@ class PointLight(ComponentBase):
       },
     """
 
+    object_types = {"LIGHT"}
+    interned = True
+
     @staticmethod
     def encode(config, obj):
         assert PointLight.is_present(obj)
 
-        return Map(
-            type="bevy_pbr::light::PointLight",
-            struct=Map(
-                color=RgbaLinear(obj.data.color),
-                intensity=F32(obj.data.energy),
-                range=F32(obj.data.cutoff_distance),
-                radius=F32(obj.data.shadow_soft_size),
-                shadows_enabled=Bool(obj.data.use_shadow),
-                shadow_depth_bias=F32(obj.data.shadow_buffer_bias),
-                shadow_normal_bias=F32(
-                    obj.bevy_point_light_properties.shadow_normal_bias
-                ),
-            ),
+        return POINT_LIGHT.fill(
+            color=RgbaLinear.process(obj.data.color),
+            intensity=obj.data.energy,
+            range=obj.data.cutoff_distance,
+            radius=obj.data.shadow_soft_size,
+            shadows_enabled=obj.data.use_shadow,
+            shadow_depth_bias=obj.data.shadow_buffer_bias,
+            shadow_normal_bias=obj.bevy_point_light_properties.shadow_normal_bias,
         )
 
     @staticmethod
@@ -152,6 +166,9 @@ register_component(
             fields=[],
         ),
         is_present_function=PointLight.is_present,
+        object_types=PointLight.object_types,
+        use_template=True,
+        interned=True,
     )
 )
 
@@ -165,5 +182,8 @@ register_component(
             fields=[],
         ),
         is_present_function=PointLight.is_present,
+        object_types=PointLight.object_types,
+        use_template=True,
+        interned=True,
     )
 )
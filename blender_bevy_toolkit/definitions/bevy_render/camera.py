@@ -18,6 +18,9 @@ logger = logging.getLogger(__name__)
 
 @register_component
 class Camera(ComponentBase):
+    object_types = {"CAMERA"}
+    interned = True
+
     @staticmethod
     def encode(config, obj):
         """
@@ -101,6 +104,9 @@ register_component(
             fields=[],
         ),
         is_present_function=Camera.is_present,
+        object_types=Camera.object_types,
+        use_template=True,
+        interned=True,
     )
 )
 
@@ -114,6 +120,9 @@ register_component(
             fields=[],
         ),
         is_present_function=Camera.is_present,
+        object_types=Camera.object_types,
+        use_template=True,
+        interned=True,
     )
 )
 
@@ -124,6 +133,9 @@ class PerspectiveProjection(ComponentBase):
     Controls for Perspective projection matrix
     """
 
+    object_types = Camera.object_types
+    interned = True
+
     @staticmethod
     def encode(config, obj):
         return Map(
@@ -229,6 +241,9 @@ class OrthographicProjection(ComponentBase):
           },
     """
 
+    object_types = Camera.object_types
+    interned = True
+
     @staticmethod
     def encode(config, obj):
         return Map(
@@ -11,11 +11,40 @@ from blender_bevy_toolkit.component_constructor import (
 
 import logging
 from blender_bevy_toolkit.utils import jdict
-from blender_bevy_toolkit.rust_types import F32, Option, Enum, EnumValue, Map, Bool
+from blender_bevy_toolkit.rust_types import (
+    F32,
+    Option,
+    Enum,
+    EnumValue,
+    Map,
+    Bool,
+    Slot,
+    Template,
+)
 
 logger = logging.getLogger(__name__)
 
 
+VISIBILITY = Template(
+    Map(
+        type="bevy_render::view::visibility::Visibility",
+        struct=Map(
+            is_visible=Bool(Slot("is_visible")),
+        ),
+    )
+)
+
+COMPUTED_VISIBILITY = Template(
+    Map(
+        type="bevy_render::view::visibility::ComputedVisibility",
+        struct=Map(
+            is_visible_in_hierarchy=Bool(Slot("visible")),
+            is_visible_in_view=Bool(Slot("visible")),
+        ),
+    )
+)
+
+
 @register_component
 class Visibility(ComponentBase):
     """
@@ -34,14 +63,12 @@ class Visibility(ComponentBase):
 
     """
 
+    object_types = {"MESH"}
+    interned = True
+
     @staticmethod
     def encode(config, obj):
-        return Map(
-            type="bevy_render::view::visibility::Visibility",
-            struct=Map(
-                is_visible=Bool(not obj.hide_render),
-            ),
-        )
+        return VISIBILITY.fill(is_visible=not obj.hide_render)
 
     @staticmethod
     def is_present(obj):
@@ -105,15 +132,12 @@ class ComputedVisibility(ComponentBase):
 
     """
 
+    object_types = Visibility.object_types
+    interned = True
+
     @staticmethod
     def encode(config, obj):
-        return Map(
-            type="bevy_render::view::visibility::ComputedVisibility",
-            struct=Map(
-                is_visible_in_hierarchy=Bool(not obj.hide_render),
-                is_visible_in_view=Bool(not obj.hide_render),
-            ),
-        )
+        return COMPUTED_VISIBILITY.fill(visible=not obj.hide_render)
 
     @staticmethod
     def is_present(obj):
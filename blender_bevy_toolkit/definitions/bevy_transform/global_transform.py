@@ -1,8 +1,53 @@
+import mathutils
+
 from blender_bevy_toolkit.component_base import (
     register_component,
     ComponentBase,
     rust_types,
 )
+from blender_bevy_toolkit import transforms
+
+
+def vec3a_shape(axis):
+    return rust_types.Map(
+        type="glam::f32::sse2::vec3a::Vec3A",
+        struct=rust_types.Map(
+            x=rust_types.F32(rust_types.Slot(axis + "_x")),
+            y=rust_types.F32(rust_types.Slot(axis + "_y")),
+            z=rust_types.F32(rust_types.Slot(axis + "_z")),
+        ),
+    )
+
+
+# Compiled once, so that only the twelve numbers are filled in for each object
+GLOBAL_TRANSFORM = rust_types.Template(
+    rust_types.Map(
+        type="bevy_transform::components::global_transform::GlobalTransform",
+        tuple_struct=rust_types.List(
+            rust_types.Map(
+                type="glam::f32::affine3a::Affine3A",
+                struct=rust_types.Map(
+                    matrix3=rust_types.Map(
+                        type="glam::f32::sse2::mat3a::Mat3A",
+                        struct=rust_types.Map(
+                            x_axis=vec3a_shape("x_axis"),
+                            y_axis=vec3a_shape("y_axis"),
+                            z_axis=vec3a_shape("z_axis"),
+                        ),
+                    ),
+                    translation=vec3a_shape("w_axis"),
+                ),
+            ),
+        ),
+    )
+)
+
+# The order of the values from transforms.BulkTransforms.global_transform
+GLOBAL_TRANSFORM_SLOTS = tuple(
+    f"{axis}_{name}"
+    for axis in ("x_axis", "y_axis", "z_axis", "w_axis")
+    for name in "xyz"
+)
 
 
 @register_component
@@ -95,64 +140,20 @@ class GlobalTransform(ComponentBase):
       },
         """
 
-        transform = obj.matrix_world
-        x_axis = [transform[0][0], transform[0]
-                  [1], transform[0][2], transform[0][3]]
-        y_axis = [transform[1][0], transform[1]
-                  [1], transform[1][2], transform[1][3]]
-        z_axis = [transform[2][0], transform[2]
-                  [1], transform[2][2], transform[2][3]]
-        w_axis = [transform[3][0], transform[3]
-                  [1], transform[3][2], transform[3][3]]
-                    
-
-        return rust_types.Map(
-            type="bevy_transform::components::global_transform::GlobalTransform",
-            tuple_struct=rust_types.List(
-                rust_types.Map(
-                    type="glam::f32::affine3a::Affine3A",
-                    struct=rust_types.Map(
-                        matrix3=rust_types.Map(
-                            type="glam::f32::sse2::mat3a::Mat3A",
-                            struct=rust_types.Map(
-                                x_axis=rust_types.Map(
-                                    type="glam::f32::sse2::vec3a::Vec3A",
-                                    struct=rust_types.Map(
-                                        x=rust_types.F32(x_axis[0]),
-                                        y=rust_types.F32(x_axis[1]),
-                                        z=rust_types.F32(x_axis[2]),
-                                    )
-                                ),
-                                y_axis=rust_types.Map(
-                                    type="glam::f32::sse2::vec3a::Vec3A",
-                                    struct=rust_types.Map(
-                                        x=rust_types.F32(y_axis[0]),
-                                        y=rust_types.F32(y_axis[1]),
-                                        z=rust_types.F32(y_axis[2]),
-                                    )
-                                ),
-                                z_axis=rust_types.Map(
-                                    type="glam::f32::sse2::vec3a::Vec3A",
-                                    struct=rust_types.Map(
-                                        x=rust_types.F32(z_axis[0]),
-                                        y=rust_types.F32(z_axis[1]),
-                                        z=rust_types.F32(z_axis[2]),
-                                    )
-                                )
-                            )
-                        ),
-                        translation=rust_types.Map(
-                            type="glam::f32::sse2::vec3a::Vec3A",
-                            struct=rust_types.Map(
-                                x=rust_types.F32(w_axis[0]),
-                                y=rust_types.F32(w_axis[1]),
-                                z=rust_types.F32(w_axis[2]),
-                            )
-                        )
-                    )
-                ),
-            ),
-        )
+        bulk = config.get("transforms")
+        values = bulk.global_transform(obj) if bulk is not None else None
+        if values is not None:
+            return GLOBAL_TRANSFORM.fill(**dict(zip(GLOBAL_TRANSFORM_SLOTS, values)))
+
+        # The world matrix in bevy's Y-up, as BulkTransforms converts it
+        y_up = mathutils.Matrix(transforms.Y_UP)
+        transform = y_up @ obj.matrix_world @ y_up.transposed()
+        values = {}
+        for column, axis in enumerate(("x_axis", "y_axis", "z_axis", "w_axis")):
+            for row, name in enumerate("xyz"):
+                values[f"{axis}_{name}"] = transform[row][column]
+
+        return GLOBAL_TRANSFORM.fill(**values)
 
     def is_present(obj):
         """Returns true if the supplied object has this component"""
@@ -1,8 +1,41 @@
+import mathutils
+
 from blender_bevy_toolkit.component_base import (
     register_component,
     ComponentBase,
     rust_types,
 )
+from blender_bevy_toolkit import transforms
+
+
+def vec3_shape(prefix):
+    return rust_types.Map(
+        type="glam::f32::vec3::Vec3",
+        struct=rust_types.Map(
+            x=rust_types.F32(rust_types.Slot(prefix + "x")),
+            y=rust_types.F32(rust_types.Slot(prefix + "y")),
+            z=rust_types.F32(rust_types.Slot(prefix + "z")),
+        ),
+    )
+
+
+# Every transform has the same shape, so it is compiled once and only the
+# ten numbers are filled in for each object
+TRANSFORM = rust_types.Template(
+    rust_types.Map(
+        type="bevy_transform::components::transform::Transform",
+        struct=rust_types.Map(
+            translation=vec3_shape("t"),
+            rotation=rust_types.Quat(
+                [rust_types.Slot(f"r{axis}") for axis in "wxyz"]
+            ),
+            scale=vec3_shape("s"),
+        ),
+    )
+)
+
+# The order of the values from transforms.BulkTransforms.transform
+TRANSFORM_SLOTS = ("tx", "ty", "tz", "rw", "rx", "ry", "rz", "sx", "sy", "sz")
 
 
 @register_component
@@ -56,35 +89,33 @@ class Transform(ComponentBase):
             },
         }
         """
-        transform = obj.matrix_world
-        if obj.parent is None:
+        bulk = config.get("transforms")
+        values = bulk.transform(obj) if bulk is not None else None
+        if values is not None:
+            return TRANSFORM.fill(**dict(zip(TRANSFORM_SLOTS, values)))
+
+        # Relative to the entity the object is parented to, as in
+        # BulkTransforms. A parent that isn't exported leaves it at the root
+        if config["entity_ids"].get(obj.parent) is None:
             transform = obj.matrix_world
         else:
-            transform = obj.matrix_local
+            transform = obj.parent.matrix_world.inverted_safe() @ obj.matrix_world
 
-        position, rotation, scale = transform.decompose()     
+        y_up = mathutils.Matrix(transforms.Y_UP)
+        transform = y_up @ transform @ y_up.transposed()
+        position, rotation, scale = transform.decompose()
 
-        return rust_types.Map(
-            type="bevy_transform::components::transform::Transform",
-            struct=rust_types.Map(
-                translation=rust_types.Map(
-                    type="glam::f32::vec3::Vec3",
-                    struct=rust_types.Map(
-                        x=rust_types.F32(position[0]),
-                        y=rust_types.F32(position[2]),
-                        z=rust_types.F32(-position[1]),
-                    )
-                ),
-                rotation=rust_types.Quat(rotation),
-                scale=rust_types.Map(
-                    type="glam::f32::vec3::Vec3",
-                    struct=rust_types.Map(
-                        x=rust_types.F32(scale.x),
-                        y=rust_types.F32(scale.y),
-                        z=rust_types.F32(scale.z),
-                    )
-                ),
-            ),
+        return TRANSFORM.fill(
+            tx=position[0],
+            ty=position[1],
+            tz=position[2],
+            rw=rotation[0],
+            rx=rotation[1],
+            ry=rotation[2],
+            rz=rotation[3],
+            sx=scale.x,
+            sy=scale.y,
+            sz=scale.z,
         )
 
     def is_present(obj):
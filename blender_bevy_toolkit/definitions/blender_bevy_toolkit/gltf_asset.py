@@ -0,0 +1,57 @@
+from blender_bevy_toolkit.component_base import (
+    register_component,
+    ComponentBase,
+)
+from blender_bevy_toolkit import rust_types
+from blender_bevy_toolkit import gltf
+from blender_bevy_toolkit.utils import scene_path
+
+
+@register_component
+class GltfAsset(ComponentBase):
+    """The GLTF file containing this objects geometry. Objects that share a
+    data-block reference the same file. The path is relative to the scene
+    file the entity is in (so starts with "../" in prefabs and grid cells).
+
+    {
+        "type": "blender_bevy_toolkit::GltfAsset",
+        "struct": {
+            "path": {
+                "type": "alloc::string::String",
+                "value": "meshes/Cube_6f1ed002.glb",
+            },
+        },
+    },
+    """
+
+    object_types = gltf.GEOMETRY_TYPES
+    interned = True
+
+    @staticmethod
+    def encode(config, obj):
+        """Returns a Component representing this component"""
+        return rust_types.Map(
+            type="blender_bevy_toolkit::GltfAsset",
+            struct=rust_types.Map(
+                path=rust_types.String(
+                    scene_path(config, gltf.asset_path(config, obj))
+                ),
+            ),
+        )
+
+    @staticmethod
+    def is_present(obj):
+        """Returns true if the supplied object has this component"""
+        return gltf.has_asset(obj)
+
+    @staticmethod
+    def can_add(obj):
+        return False
+
+    @staticmethod
+    def register():
+        pass
+
+    @staticmethod
+    def unregister():
+        pass
@@ -0,0 +1,61 @@
+from blender_bevy_toolkit.component_base import (
+    register_component,
+    ComponentBase,
+)
+from blender_bevy_toolkit import rust_types
+from blender_bevy_toolkit import prefabs
+from blender_bevy_toolkit.utils import scene_path
+
+
+@register_component
+class PrefabInstance(ComponentBase):
+    """The prefab scene of the collection this object instances. The prefab
+    is spawned as a child of this entity. The path is relative to the scene
+    file the entity is in.
+
+    {
+        "type": "blender_bevy_toolkit::PrefabInstance",
+        "struct": {
+            "path": {
+                "type": "alloc::string::String",
+                "value": "prefabs/Tree_bd1c75f9.scn",
+            },
+        },
+    },
+    """
+
+    object_types = {"EMPTY"}
+    interned = True
+
+    @staticmethod
+    def encode(config, obj):
+        """Returns a Component representing this component"""
+        if not config.get("export_prefabs", True):
+            return None
+        return rust_types.Map(
+            type="blender_bevy_toolkit::PrefabInstance",
+            struct=rust_types.Map(
+                path=rust_types.String(
+                    scene_path(
+                        config, prefabs.prefab_file(config, obj.instance_collection)
+                    )
+                ),
+            ),
+        )
+
+    @staticmethod
+    def is_present(obj):
+        """Returns true if the supplied object has this component"""
+        return prefabs.is_instancer(obj)
+
+    @staticmethod
+    def can_add(obj):
+        return False
+
+    @staticmethod
+    def register():
+        pass
+
+    @staticmethod
+    def unregister():
+        pass
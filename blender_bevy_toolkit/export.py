@@ -1,13 +1,28 @@
 """ Converts from blender objects into a scene description """
 import os
+import sys
+import time
+import queue
 import logging
+import itertools
+import threading
+import multiprocessing
 import bpy
 from . import component_base, rust_types, jdict
+from . import cache, chunks, compression, instances, prefabs, transforms
+from .cache import ENTITY_CACHE
 
 
 logger = logging.getLogger(__name__)
 
 
+# How many entities are extracted and encoded together by the pipeline
+ENCODE_CHUNK_SIZE = 512
+
+# Buffer size of the file written by the pipeline's writer thread
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
 class Entity:
     """In an ECS, an entity is an opaque ID that is referenced by (or references)
     a set of components. This class represents an entity and as such ... contains
@@ -17,40 +32,465 @@ class Entity:
         self.entity_id = entity_id
         self.components = comp
 
+    def expand(self):
+        """The plain rust_types nodes that the entity is encoded as"""
+        return rust_types.ron.Struct(
+            entity=rust_types.Int(self.entity_id),
+            components=rust_types.List(*self.components),
+        )
+
     def to_str(self, indent):
         """Convert into a ... string!"""
-        return rust_types.ron.encode(
-            rust_types.ron.Struct(
-                entity=rust_types.Int(self.entity_id),
-                components=rust_types.List(*self.components),
-            ),
-            indent,
-        )
+        return rust_types.ron.encode(self.expand(), indent)
 
 
-def export_entity(config, obj, entity_id):
-    """Compile all the data about an object into an entity with components"""
+def export_entity(config, obj, entity_id, components=None):
+    """Compile all the data about an object into an entity with components.
+    If a list of components is passed in, only these are checked for presence
+    on the object"""
     logger.debug(
         jdict(event="serializing_entity", obj_name=obj.name, entity_id=entity_id)
     )
     entity = Entity(entity_id, [])
 
-    for component in component_base.COMPONENTS:
+    if components is None:
+        components = component_base.COMPONENTS
+
+    for component in components:
         if component.is_present(obj):
             new_component = component.encode(config, obj)
+            if new_component is None:
+                continue
+            if getattr(component, "interned", False):
+                new_component = rust_types.ron.intern(new_component)
             entity.components.append(new_component)
 
     return entity
 
 
+def export_cached_entity(config, obj, entity_id, components=None):
+    """Returns the encoded entity for an object, reusing the text from the
+    previous export if the object has not changed since then.
+
+    The entity is encoded as an item of the top-level list of entities"""
+    text, identity, fingerprint = ENTITY_CACHE.get(config, obj, entity_id)
+    if text is None:
+        entity = export_entity(config, obj, entity_id, components)
+        text = rust_types.ron.encode(entity, 1)
+        ENTITY_CACHE.put(obj.name_full, identity, fingerprint, text)
+    return rust_types.ron.Raw(text)
+
+
+def encode_chunk(settings, nodes):
+    """Encodes each node as an item of the top-level list of entities. This
+    may run in a worker process, so the ron settings are passed in. Returns
+    the texts, the number of interned hits and misses, and the time taken"""
+    start = time.perf_counter()
+    rust_types.ron.use_settings(settings)
+    interned = rust_types.ron.INTERNED
+    hits, misses = interned.hits, interned.misses
+    texts = [rust_types.ron.encode(node, 1) for node in nodes]
+    return (
+        texts,
+        interned.hits - hits,
+        interned.misses - misses,
+        time.perf_counter() - start,
+    )
+
+
+class PipelineAborted(Exception):
+    """Raised in one stage of the pipeline when another stage has failed"""
+
+
+class Stage:
+    """One stage of the export pipeline: counts the items it has processed,
+    the time spent working on them and the time spent waiting for the
+    stages either side of it.
+
+    Stages pass items to each other through bounded queues, so a stage that
+    is waiting a lot is being held up by a slower one (the bottleneck)"""
+
+    def __init__(self, name, failed):
+        self.name = name
+        self.failed = failed
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+
+    def put(self, items, item):
+        """Put an item on a queue, waiting for space if it is full"""
+        start = time.perf_counter()
+        while True:
+            if self.failed.is_set():
+                raise PipelineAborted()
+            try:
+                items.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.waiting += time.perf_counter() - start
+
+    def get(self, items):
+        """Take the next item from a queue, waiting for one if it is empty"""
+        start = time.perf_counter()
+        while True:
+            if self.failed.is_set():
+                raise PipelineAborted()
+            try:
+                item = items.get(timeout=0.1)
+                break
+            except queue.Empty:
+                pass
+        self.waiting += time.perf_counter() - start
+        return item
+
+    def report(self):
+        """Throughput statistics"""
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy, 3),
+            "wait_seconds": round(self.waiting, 3),
+            "items_per_second": round(self.items / self.busy) if self.busy else None,
+        }
+
+
+# How many chunks of entities can be waiting between two pipeline stages.
+# This bounds the memory used when one stage is slower than the others
+PIPELINE_QUEUE_SIZE = 8
+
+
+def start_pool(workers):
+    """Start a pool of forked worker processes. multiprocessing.Pool forks
+    all of its workers before returning, so they are forked from the main
+    thread before the pipeline's threads exist.
+
+    Forking copies only the thread that forks, so a lock held by any other
+    thread at that moment stays locked forever in the child. The workers
+    only encode the rust_types nodes sent to them and never use bpy, so the
+    rest of blender's state that is copied is left alone. Pools are only
+    used on Linux (see export_all): on macOS forking a process that has used
+    the system frameworks (as blender has) is not safe"""
+    return multiprocessing.get_context("fork").Pool(workers)
+
+
+def export_pipelined(
+    config, components_by_type, use_cache, workers, outfile, extra_entities=()
+):
+    """Export the entities with a pipeline of three stages that run at the
+    same time:
+
+    - extract (this thread): reads chunks of objects from blender into plain
+      rust_types nodes. Cached entities are passed on as their text.
+    - encode (a thread): encodes the chunks, either itself or by handing them
+      to a pool of `workers` forked processes
+    - write (a thread): writes the encoded entities to the file in order,
+      and stores them in the entity cache. extra_entities are written
+      after them
+
+    bpy is not thread-safe, so only the extract stage reads from blender.
+    The other stages are only passed rust_types nodes and plain values (eg
+    an object's full name rather than the object).
+
+    Returns a dict of the statistics of each stage"""
+    failed = threading.Event()
+    errors = []
+    extract, encode, write = (Stage(n, failed) for n in ("extract", "encode", "write"))
+    to_encode = queue.Queue(PIPELINE_QUEUE_SIZE)
+    to_write = queue.Queue(PIPELINE_QUEUE_SIZE)
+    settings = rust_types.ron.current_settings()
+
+    pool = None
+    if workers > 1:
+        pool = start_pool(workers)
+
+    def encode_stage():
+        while True:
+            item = encode.get(to_encode)
+            if item is None:
+                break
+            entries, nodes = item
+            start = time.perf_counter()
+            if pool is None:
+                result = encode_chunk(settings, nodes)
+                encode.busy += time.perf_counter() - start
+            else:
+                # The time is added once the worker reports it
+                result = pool.apply_async(encode_chunk, (settings, nodes))
+            encode.items += len(nodes)
+            encode.put(to_write, (entries, result))
+        encode.put(to_write, None)
+
+    def written_entities():
+        # Each entry is either cached text, or the cache details to store
+        # the next of the encoded texts under
+        while True:
+            item = write.get(to_write)
+            if item is None:
+                return
+            entries, result = item
+            if pool is not None:
+                start = time.perf_counter()
+                while not result.ready():
+                    if failed.is_set():
+                        raise PipelineAborted()
+                    result.wait(0.1)
+                texts, hits, misses, seconds = result.get()
+                write.waiting += time.perf_counter() - start
+                # Counted in the worker processes, so not seen here yet
+                encode.busy += seconds
+                rust_types.ron.INTERNED.hits += hits
+                rust_types.ron.INTERNED.misses += misses
+            else:
+                texts = result[0]
+
+            start = time.perf_counter()
+            texts = iter(texts)
+            for entry in entries:
+                if entry.__class__ is not str:
+                    text = next(texts)
+                    if entry is not None:
+                        ENTITY_CACHE.put(*entry, text)
+                    entry = text
+                # Time spent in the file writes between yields is also busy
+                write.busy += time.perf_counter() - start
+                yield rust_types.ron.Raw(entry)
+                start = time.perf_counter()
+            write.items += len(entries)
+
+    def write_stage():
+        rust_types.ron.encode_iter_to(
+            outfile, itertools.chain(written_entities(), extra_entities)
+        )
+
+    def run(stage_function):
+        try:
+            stage_function()
+        except PipelineAborted:
+            pass
+        except BaseException as error:  # pylint: disable=W0703
+            errors.append(error)
+            failed.set()
+
+    threads = [
+        threading.Thread(target=run, args=(f,), name=f"bevy_export_{f.__name__}")
+        for f in (encode_stage, write_stage)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        objects = iter(config["entity_ids"].items())
+        while True:
+            start = time.perf_counter()
+            entries = []
+            nodes = []
+            for obj, entity_id in itertools.islice(objects, ENCODE_CHUNK_SIZE):
+                if use_cache:
+                    text, identity, fingerprint = ENTITY_CACHE.get(
+                        config, obj, entity_id
+                    )
+                    if text is not None:
+                        entries.append(text)
+                        continue
+                    # The writer thread stores the text, and can't use bpy
+                    entries.append((obj.name_full, identity, fingerprint))
+                else:
+                    entries.append(None)
+                entity = export_entity(
+                    config, obj, entity_id, components_by_type[obj.type]
+                )
+                nodes.append(entity.expand())
+            extract.busy += time.perf_counter() - start
+            extract.items += len(entries)
+
+            if not entries:
+                break
+            extract.put(to_encode, (entries, nodes))
+        extract.put(to_encode, None)
+    except PipelineAborted:
+        pass
+    except BaseException:
+        failed.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    if errors:
+        raise errors[0]
+
+    stages = {stage.name: stage.report() for stage in (extract, encode, write)}
+    logger.info(jdict(event="export_pipeline", workers=workers, **stages))
+    return stages
+
+
+def build_hierarchy(objects):
+    """Sort the objects parents-first, in one pass over them. Returns the
+    sorted objects and a dict of each parent object -> its children.
+    Objects whose parent isn't one of the objects are treated as roots"""
+    objects = list(objects)
+    exported = set(objects)
+    order = []
+    children = {}
+    for obj in objects:
+        parent = obj.parent
+        if parent is None or parent not in exported:
+            order.append(obj)
+        else:
+            children.setdefault(parent, []).append(obj)
+
+    # Breadth first: the list grows with each object's children as it is
+    # walked, so each parent comes before its children
+    for obj in order:
+        order.extend(children.get(obj, ()))
+    return order, children
+
+
+def prepare_objects(config, objects, offset=None):
+    """Set up the config for exporting the objects as the entities of one
+    scene file. Returns a dict of object type -> the components to check
+    objects of that type for"""
+    # Entities are numbered (and written) parents-first, so that a parent
+    # has always been spawned by the time its children are. Components that
+    # reference other entities (eg Parent, Children) look up the ID of an
+    # object here rather than searching the scene for it
+    order, config["children"] = build_hierarchy(objects)
+    config["entity_ids"] = {o: i for i, o in enumerate(order)}
+    # The transform components look up their values here rather than
+    # reading and decomposing each object's matrices themselves
+    config.pop("transforms", None)
+    if config.get("bulk_transforms", True) and transforms.numpy is not None:
+        config["transforms"] = transforms.BulkTransforms(
+            objects, config["children"], offset
+        )
+    elif offset is not None and any(offset):
+        logger.warning(
+            jdict(event="prefab_offset_ignored", output=config["output_filepath"])
+        )
+
+    # Bucket the objects by type so that each object is only checked against
+    # the components that can apply to objects of that type
+    return {
+        object_type: component_base.components_for_object_type(object_type)
+        for object_type in {o.type for o in config["entity_ids"]}
+    }
+
+
+def write_entities(config, entities, count):
+    """Write a scene file of count entities, in config["output_format"]"""
+    if config.get("output_format", "ron") == "binary":
+        with compression.open_output(config, binary=True) as outfile:
+            rust_types.binary.encode_iter_to(outfile, entities, count)
+    else:
+        with compression.open_output(config) as outfile:
+            rust_types.ron.encode_iter_to(outfile, entities)
+
+
+def export_prefabs(config, objects):
+    """Export each collection instanced by the objects as a prefab scene
+    file (see prefabs.py). Returns the number of entities in the prefabs"""
+    total = 0
+    for collection in prefabs.instanced_collections(objects):
+        prefab_config = dict(
+            config,
+            output_filepath=os.path.join(
+                config["output_folder"], prefabs.prefab_file(config, collection)
+            ),
+        )
+        os.makedirs(os.path.dirname(prefab_config["output_filepath"]), exist_ok=True)
+        components_by_type = prepare_objects(
+            prefab_config, collection.all_objects, collection.instance_offset
+        )
+
+        # Prefabs are small, so they are written serially without the cache
+        entities = (
+            export_entity(prefab_config, o, i, components_by_type[o.type])
+            for o, i in prefab_config["entity_ids"].items()
+        )
+        write_entities(prefab_config, entities, len(prefab_config["entity_ids"]))
+        total += len(prefab_config["entity_ids"])
+        logger.info(
+            jdict(
+                event="exported_prefab",
+                collection=collection.name,
+                entities=len(prefab_config["entity_ids"]),
+            )
+        )
+    return total
+
+
+def export_chunks(config, components_by_type, buffers):
+    """Write each cell of the grid (see chunks.py) to its own scene file,
+    along with the index of the cells. buffers are the instances.WrittenBuffers
+    to add to the cells. Returns the number of cells"""
+    cells = chunks.partition(config["entity_ids"], config["chunk_size"])
+    for buffer in buffers:
+        cell = cells.get(buffer.cell)
+        if cell is None:
+            cell = cells[buffer.cell] = chunks.Cell(buffer.cell)
+        cell.buffers.append(buffer)
+        cell.include(buffer.minimum, buffer.maximum)
+
+    for key, cell in cells.items():
+        cell_config = dict(
+            config,
+            output_filepath=os.path.join(
+                config["output_folder"], chunks.cell_file(config, key)
+            ),
+        )
+        os.makedirs(os.path.dirname(cell_config["output_filepath"]), exist_ok=True)
+        # Each file numbers its entities from 0. A cell holds whole
+        # hierarchies, so the children and transforms found for the whole
+        # scene still apply
+        cell_config["entity_ids"] = {o: i for i, o in enumerate(cell.objects)}
+        entities = itertools.chain(
+            (
+                export_entity(cell_config, o, i, components_by_type[o.type])
+                for o, i in cell_config["entity_ids"].items()
+            ),
+            (
+                Entity(len(cell.objects) + n, [buffer.component(cell_config)])
+                for n, buffer in enumerate(cell.buffers)
+            ),
+        )
+        write_entities(
+            cell_config, entities, len(cell.objects) + len(cell.buffers)
+        )
+
+    chunks.write_index(config, cells)
+    logger.info(jdict(event="export_chunks", cells=len(cells)))
+    return len(cells)
+
+
 def export_all(config):
-    """Exports everything from this bend file"""
+    """Exports everything from this bend file. Returns a report dict
+    with statistics about the export"""
+    # The ron module's settings are shared by everything that encodes RON
+    # in this blender, so config["float_precision"] only applies during
+    # the export
+    previous = rust_types.ron.current_settings()
+    indent_size, indent_char, _ = previous
+    rust_types.ron.use_settings(
+        (indent_size, indent_char, config.get("float_precision", "f64"))
+    )
+    try:
+        return export_scene(config)
+    finally:
+        rust_types.ron.use_settings(previous)
+
+
+def export_scene(config):
+    """Exports everything from this bend file, with the ron settings set up
+    by export_all"""
     output_folder = os.path.dirname(config["output_filepath"])
 
     if config["make_duplicates_real"]:
-        # Make all collections into their real objects. Ideally one day this
-        # will be subbed for actually using proper instancing of collections
-        # but I couldn't get this to work in bevy :(
+        # Make all collections into their real objects. This is the old way
+        # of exporting collection instances: export_prefabs exports each
+        # collection once instead, without changing the blend file
         bpy.ops.object.select_all(action="SELECT")
         bpy.ops.object.duplicates_make_real(use_base_parent=True, use_hierarchy=True)
 
@@ -62,7 +502,89 @@ def export_all(config):
     config["output_folder"] = output_folder
     config["scene"] = bpy.context.scene
 
-    entities = [export_entity(config, o, i) for i, o in enumerate(scene.objects)]
+    if config.get("clear_cache", False):
+        ENTITY_CACHE.clear()
+    rust_types.ron.INTERNED.clear()
+
+    prefab_entities = 0
+    if config.get("export_prefabs", True):
+        prefab_entities = export_prefabs(config, scene.objects)
+
+    components_by_type = prepare_objects(config, scene.objects)
+
+    # Instances generated by geometry nodes and particle systems are not in
+    # scene.objects. Each buffer of them is one more entity after the objects
+    buffers = []
+    if config.get("export_instances", True):
+        buffers = instances.export_instances(
+            config, bpy.context.evaluated_depsgraph_get()
+        )
+    extra_entities = [
+        Entity(len(config["entity_ids"]) + n, [buffer.component(config)])
+        for n, buffer in enumerate(buffers)
+    ]
+    entity_count = len(config["entity_ids"]) + len(extra_entities)
+
+    # The entity cache holds RON text, and a binary file's symbol table is
+    # built up as it is written, so binary files are always written serially.
+    # The cells of a chunked scene are written serially too. Both bypass the
+    # cache, leaving it as it was for the next export that uses it
+    binary = config.get("output_format", "ron") == "binary"
+    chunked = bool(config.get("chunk_size"))
+    use_cache = config.get("use_cache", True) and not binary and not chunked
+    if use_cache:
+        ENTITY_CACHE.begin_export(config, cache.disk_cache(config))
+        export_function = export_cached_entity
+    else:
+        export_function = export_entity
+
+    workers = config.get("encode_workers", 1) or os.cpu_count()
+    if workers > 1 and not sys.platform.startswith("linux"):
+        logger.warning(jdict(event="encode_workers_unsupported", workers=workers))
+        workers = 1
+
+    report = {
+        "entities": entity_count,
+        "prefab_entities": prefab_entities,
+        "instance_buffers": len(buffers),
+        "output_format": config.get("output_format", "ron"),
+        "output_file": compression.output_path(config),
+        "encode_workers": workers,
+    }
+
+    if chunked:
+        report["encode_workers"] = 1
+        report["output_file"] = chunks.index_path(config)
+        report["cells"] = export_chunks(config, components_by_type, buffers)
+    elif binary:
+        report["encode_workers"] = 1
+        entities = (
+            export_entity(config, o, i, components_by_type[o.type])
+            for o, i in config["entity_ids"].items()
+        )
+        write_entities(
+            config, itertools.chain(entities, extra_entities), entity_count
+        )
+    elif workers > 1 or config.get("pipeline", False):
+        with compression.open_output(config, buffering=WRITE_BUFFER_SIZE) as outfile:
+            report["pipeline"] = export_pipelined(
+                config, components_by_type, use_cache, workers, outfile, extra_entities
+            )
+    else:
+        # Entities are generated lazily so that only one of them (and its
+        # encoded form) is held in memory at a time while writing
+        entities = (
+            export_function(config, o, i, components_by_type[o.type])
+            for o, i in config["entity_ids"].items()
+        )
+        write_entities(
+            config, itertools.chain(entities, extra_entities), entity_count
+        )
+
+    report.update(rust_types.ron.INTERNED.report())
+    if use_cache:
+        ENTITY_CACHE.end_export()
+        report.update(ENTITY_CACHE.report())
 
-    with open(config["output_filepath"], "w", encoding="utf-8") as outfile:
-        outfile.write(rust_types.ron.encode(rust_types.ron.List(*entities)))
+    logger.info(jdict(event="export_complete", **report))
+    return report
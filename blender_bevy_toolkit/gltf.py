@@ -0,0 +1,497 @@
+""" Exports the geometry of the scene as GLTF files that the entities can
+reference. Objects that share a data-block (eg thousands of instances of the
+same rock) share a single exported file.
+
+The export can optionally be spread across several background blender
+processes (see gltf_worker.py), each exporting a share of the files from a
+saved copy of the blend file.
+
+Each mesh's content is hashed, and files whose mesh has not changed since
+they were last exported (and that are still on disk unmodified) are skipped.
+"""
+import os
+import json
+import array
+import hashlib
+import logging
+import tempfile
+import contextlib
+import subprocess
+
+import bpy
+import mathutils
+
+from . import cache
+from .utils import jdict, short_hash
+
+logger = logging.getLogger(__name__)
+
+
+# Object types whose data is exported as a GLTF mesh
+GEOMETRY_TYPES = {"MESH", "CURVE", "SURFACE", "META", "FONT"}
+
+# How mesh_hash reads the values of each type of mesh attribute: the
+# property of each item, the array typecode and the number of values
+ATTRIBUTE_VALUES = {
+    "FLOAT": ("value", "f", 1),
+    "INT": ("value", "i", 1),
+    "INT8": ("value", "i", 1),
+    "BOOLEAN": ("value", "b", 1),
+    "FLOAT2": ("vector", "f", 2),
+    "FLOAT_VECTOR": ("vector", "f", 3),
+    "INT16_2D": ("value", "i", 2),
+    "INT32_2D": ("value", "i", 2),
+    "FLOAT_COLOR": ("color", "f", 4),
+    "BYTE_COLOR": ("color", "f", 4),
+    "QUATERNION": ("value", "f", 4),
+    "FLOAT4X4": ("value", "f", 16),
+}
+
+
+def has_asset(obj):
+    """Returns true if the object has geometry that is exported as a GLTF"""
+    return obj.type in GEOMETRY_TYPES and obj.data is not None
+
+
+def asset_key(config, obj):
+    """What the exported file for an object is made from: its data-block
+    (names are only unique within one type of data-block). If modifiers are
+    applied during export then objects with modifiers may differ from other
+    users of the same data, so they get a file of their own."""
+    key = cache.data_key(obj.data)
+    if config.get("gltf_apply_modifiers", False) and obj.modifiers:
+        key += (obj.name_full,)
+    return key
+
+
+def asset_name(config, obj):
+    """The name of the exported file (without extension) for an object.
+    clean_name maps many names to the same text (eg "Rock.001" and
+    "Rock_001"), so a hash of the asset key keeps the names apart"""
+    if config.get("gltf_apply_modifiers", False) and obj.modifiers:
+        name = f"{obj.data.name}.{obj.name}"
+    else:
+        name = obj.data.name
+    return f"{bpy.path.clean_name(name)}_{short_hash(*asset_key(config, obj))}"
+
+
+def asset_path(config, obj):
+    """The path of the exported file for an object, relative to the scene file"""
+    filename = asset_name(config, obj) + config.get("mesh_extension", ".glb")
+    return f"{config['mesh_output_folder']}/{filename}"
+
+
+def group_objects(config, objects):
+    """Group the objects that can share an exported file. Returns a dict of
+    asset path to the objects using it, in scene order"""
+    groups = {}
+    keys = {}
+    for obj in objects:
+        if not has_asset(obj):
+            continue
+        key = asset_key(config, obj)
+        path = keys.get(key)
+        if path is None:
+            path = keys[key] = asset_path(config, obj)
+            if path in groups:
+                raise ValueError(
+                    f"{groups[path][0].name} and {obj.name} would both be "
+                    f"exported to {path}"
+                )
+            groups[path] = []
+        groups[path].append(obj)
+    return groups
+
+
+def export_meshes(config, objects, gltf_options):
+    """Export one GLTF file for each group of objects sharing a data-block.
+    gltf_options are passed through to blenders GLTF exporter.
+
+    If config["gltf_workers"] is more than 1 (or 0, meaning one per CPU) the
+    files are exported by that many background blender processes.
+
+    Returns a list of error messages for the files that failed to export"""
+    output_folder = os.path.dirname(config["output_filepath"])
+    # Clearing happened (if requested) when the scene was exported
+    disk_cache = cache.disk_cache(dict(config, clear_cache=False))
+    groups = group_objects(config, objects)
+    file_hashes = disk_cache.manifest("files") if disk_cache else {}
+    source_hashes = disk_cache.manifest("mesh_sources") if disk_cache else {}
+
+    # Each job is the path of a file to export and the object to export it from
+    jobs = []
+    new_source_hashes = {}
+    for path, users in groups.items():
+        source_hash = mesh_hash(users[0], gltf_options)
+        if source_hash is not None and source_hash == source_hashes.get(path):
+            if is_unmodified(os.path.join(output_folder, path), file_hashes.get(path)):
+                continue
+        new_source_hashes[path] = source_hash
+        jobs.append((path, users[0]))
+
+    workers = config.get("gltf_workers", 1) or os.cpu_count()
+    workers = min(workers, len(jobs))
+
+    logger.info(
+        jdict(
+            event="export_meshes",
+            objects=len(objects),
+            files=len(groups),
+            unchanged=len(groups) - len(jobs),
+            workers=workers,
+        )
+    )
+
+    if workers > 1:
+        results = export_parallel(output_folder, jobs, gltf_options, workers)
+    else:
+        results = export_serial(output_folder, jobs, gltf_options)
+
+    errors = []
+    for path, error in results:
+        if error is not None:
+            errors.append(f"{path}: {error}")
+        elif disk_cache is not None:
+            # Remember what was exported so later exports can tell
+            # whether the file on disk is still the one we wrote
+            file_hashes[path] = cache.hash_file(os.path.join(output_folder, path))
+            if new_source_hashes[path] is None:
+                source_hashes.pop(path, None)
+            else:
+                source_hashes[path] = new_source_hashes[path]
+
+    if disk_cache is not None:
+        disk_cache.save_manifests()
+
+    for error in errors:
+        logger.error(jdict(event="export_mesh_failed", error=error))
+    return errors
+
+
+def is_unmodified(file_path, expected_hash):
+    """Returns true if the file exists and has the expected contents"""
+    return (
+        expected_hash is not None
+        and os.path.exists(file_path)
+        and cache.hash_file(file_path) == expected_hash
+    )
+
+
+def socket_value(socket):
+    """The value a node socket has when nothing is linked to it"""
+    value = getattr(socket, "default_value", None)
+    if hasattr(value, "__len__") and not isinstance(value, str):
+        value = tuple(value)
+    return value
+
+
+def image_parts(image):
+    """What identifies the pixels of an image: where they come from. Returns
+    None for an image with unsaved changes (eg texture painting), whose
+    pixels would have to be hashed to tell whether it changed"""
+    if image.is_dirty:
+        return None
+    path = bpy.path.abspath(image.filepath)
+    packed = image.packed_file
+    modified = None
+    if packed is None and os.path.isfile(path):
+        modified = os.path.getmtime(path)
+    return (
+        image.name_full,
+        image.source,
+        path,
+        tuple(image.size),
+        image.colorspace_settings.name,
+        packed.size if packed else None,
+        modified,
+    )
+
+
+def node_tree_parts(tree, seen=None):
+    """What the glTF exporter can read from a node tree: the settings and
+    unlinked input values of each node, the links between them, and the
+    images and node groups used. Returns None if something in it can't be
+    hashed (see image_parts)"""
+    if seen is None:
+        seen = set()
+    if tree.name_full in seen:
+        return tree.name_full
+    seen.add(tree.name_full)
+
+    nodes = []
+    for node in tree.nodes:
+        parts = [
+            node.bl_idname,
+            node.name,
+            cache.rna_values(node),
+            [(s.identifier, socket_value(s)) for s in node.inputs],
+        ]
+        image = getattr(node, "image", None)
+        if image is not None:
+            parts.append(image_parts(image))
+            if parts[-1] is None:
+                return None
+        group = getattr(node, "node_tree", None)
+        if group is not None:
+            parts.append(node_tree_parts(group, seen))
+            if parts[-1] is None:
+                return None
+        nodes.append(parts)
+
+    links = [
+        (
+            link.from_node.name,
+            link.from_socket.identifier,
+            link.to_node.name,
+            link.to_socket.identifier,
+            link.is_muted,
+        )
+        for link in tree.links
+    ]
+    return (nodes, links)
+
+
+def material_parts(material):
+    """The settings and node tree of a material, or None if it can't be
+    hashed (see node_tree_parts)"""
+    parts = [material.name_full, cache.rna_values(material)]
+    if material.use_nodes and material.node_tree is not None:
+        parts.append(node_tree_parts(material.node_tree))
+        if parts[-1] is None:
+            return None
+    return parts
+
+
+def mesh_hash(obj, gltf_options):
+    """Hash of everything that goes into the exported file for an object: the
+    geometry, attributes (UVs, colors, sharp edges...), normals, settings and
+    shape keys of its mesh, its materials (including their node trees and the
+    images they use), its modifier stack and the export options.
+
+    Returns None for objects that can't be hashed cheaply, which are then
+    always exported: objects that are not meshes, meshes with a material
+    using an image with unsaved changes (eg from texture painting), and
+    before blender 4.1 meshes with custom normals (which can only be read by
+    calculating them, changing the mesh).
+
+    Geometry is read in bulk with foreach_get rather than one vertex at a time"""
+    if obj.type != "MESH":
+        return None
+
+    mesh = obj.data
+    # Before 4.1 custom normals are only there once calculated
+    corner_normals = getattr(mesh, "corner_normals", None)
+    if corner_normals is None and mesh.has_custom_normals:
+        return None
+    digest = hashlib.sha1()
+
+    def read(collection, attribute, typecode, size):
+        values = array.array(typecode, [0]) * (len(collection) * size)
+        collection.foreach_get(attribute, values)
+        digest.update(values.tobytes())
+
+    read(mesh.vertices, "co", "f", 3)
+    read(mesh.loops, "vertex_index", "i", 1)
+    read(mesh.polygons, "loop_total", "i", 1)
+    read(mesh.polygons, "material_index", "i", 1)
+    for uv_layer in mesh.uv_layers:
+        digest.update(uv_layer.name.encode("utf-8"))
+        read(uv_layer.data, "uv", "f", 2)
+
+    # Color attributes, sharp edges and faces and so on. Names starting with
+    # "." are blender's own (eg what is selected)
+    for attribute in mesh.attributes:
+        if attribute.name.startswith("."):
+            continue
+        digest.update(
+            repr((attribute.name, attribute.domain, attribute.data_type)).encode(
+                "utf-8"
+            )
+        )
+        if attribute.data_type in ATTRIBUTE_VALUES:
+            read(attribute.data, *ATTRIBUTE_VALUES[attribute.data_type])
+    # Before blender 3.2 vertex colors were not attributes
+    if not hasattr(mesh, "color_attributes"):
+        for layer in mesh.vertex_colors:
+            digest.update(layer.name.encode("utf-8"))
+            read(layer.data, "color", "f", 4)
+    # Before blender 3.5 sharp edges were not attributes
+    if "sharp_edge" not in mesh.attributes:
+        read(mesh.edges, "use_edge_sharp", "b", 1)
+
+    # The normals that are exported, from smooth shading, sharp edges and
+    # custom normals (before 4.1 the smoothing settings are in rna_values)
+    if corner_normals is not None:
+        read(corner_normals, "vector", "f", 3)
+
+    shape_keys = []
+    if mesh.shape_keys is not None:
+        for block in mesh.shape_keys.key_blocks:
+            shape_keys.append(
+                (block.name, block.value, block.mute, block.relative_key.name)
+            )
+            read(block.data, "co", "f", 3)
+
+    smooth = [False] * len(mesh.polygons)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+
+    materials = []
+    for slot in obj.material_slots:
+        parts = None
+        if slot.material is not None:
+            parts = material_parts(slot.material)
+            if parts is None:
+                return None
+        materials.append((slot.link, parts))
+
+    parts = [
+        cache.rna_values(mesh),
+        smooth,
+        shape_keys,
+        sorted(gltf_options.items()),
+        materials,
+        [(m.type, cache.rna_values(m)) for m in obj.modifiers],
+    ]
+    digest.update(repr(parts).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def export_serial(output_folder, jobs, gltf_options):
+    """Export each (path, object) job in this blender instance. Returns a
+    list of (path, error) in the same order as the jobs"""
+    # get objects selected in the viewport
+    viewport_selection = bpy.context.selected_objects
+
+    # deselect all objects
+    bpy.ops.object.select_all(action="DESELECT")
+
+    with export_collection() as collection:
+        for path, obj in jobs:
+            export_object(
+                obj, os.path.join(output_folder, path), gltf_options, collection
+            )
+
+    # restore viewport selection
+    for obj in viewport_selection:
+        obj.select_set(True)
+
+    return [(path, None) for path, _obj in jobs]
+
+
+def export_parallel(output_folder, jobs, gltf_options, workers):
+    """Export the (path, object) jobs using several background blender
+    processes. Each is given every N'th job. Returns a list of (path, error)
+    in the same order as the jobs"""
+    package_folder = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory(prefix="bevy_gltf_") as temp_folder:
+        # The workers load the scene from disk, so it needs to include any
+        # unsaved changes. Saving a copy leaves the open file untouched
+        blend_path = os.path.join(temp_folder, "scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+        processes = []
+        for worker in range(workers):
+            shard = list(enumerate(jobs))[worker::workers]
+            job_path = os.path.join(temp_folder, f"worker_{worker}.json")
+            results_path = os.path.join(temp_folder, f"results_{worker}.json")
+            log_path = os.path.join(temp_folder, f"worker_{worker}.log")
+
+            with open(job_path, "w", encoding="utf-8") as job_file:
+                json.dump(
+                    {
+                        "package_parent": os.path.dirname(package_folder),
+                        "package": __package__,
+                        "output_folder": output_folder,
+                        "gltf_options": gltf_options,
+                        "results": results_path,
+                        "jobs": [
+                            {"index": index, "path": path, "object": obj.name}
+                            for index, (path, obj) in shard
+                        ],
+                    },
+                    job_file,
+                )
+
+            with open(log_path, "w", encoding="utf-8") as log_file:
+                process = subprocess.Popen(  # pylint: disable=R1732
+                    [
+                        bpy.app.binary_path,
+                        "--background",
+                        "--factory-startup",
+                        blend_path,
+                        "--python",
+                        os.path.join(package_folder, "gltf_worker.py"),
+                        "--",
+                        job_path,
+                    ],
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                )
+            processes.append((process, shard, results_path, log_path))
+
+        results = [None] * len(jobs)
+        for process, shard, results_path, log_path in processes:
+            process.wait()
+            try:
+                with open(results_path, encoding="utf-8") as results_file:
+                    for result in json.load(results_file):
+                        results[result["index"]] = (result["path"], result["error"])
+            except (FileNotFoundError, json.decoder.JSONDecodeError):
+                pass
+
+            # Anything the worker didn't report on has failed with it
+            for index, (path, _obj) in shard:
+                if results[index] is None:
+                    results[index] = (
+                        path,
+                        f"worker exited with code {process.returncode}: "
+                        + _log_tail(log_path),
+                    )
+
+    return results
+
+
+def _log_tail(log_path, lines=5):
+    """The last few lines of a worker's output, for error messages"""
+    try:
+        with open(log_path, encoding="utf-8", errors="replace") as log_file:
+            return " | ".join(log_file.read().strip().splitlines()[-lines:])
+    except FileNotFoundError:
+        return ""
+
+
+@contextlib.contextmanager
+def export_collection():
+    """A temporary collection in the scene to hold the objects being exported.
+    It is removed again afterwards"""
+    collection = bpy.data.collections.new("bevy_gltf_export")
+    bpy.context.scene.collection.children.link(collection)
+    try:
+        yield collection
+    finally:
+        bpy.data.collections.remove(collection)
+
+
+def export_object(item, file_path, gltf_options, collection):
+    """Export a single object centered at the origin.
+
+    Rather than moving the object to the origin and back, a temporary copy
+    (sharing the same data-block) is placed in the export collection and
+    exported. The object in the scene is never modified, so no depsgraph
+    updates or undo steps are caused for it, and it works with any rotation
+    mode."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    temp = item.copy()
+    temp.parent = None
+    temp.constraints.clear()
+    temp.animation_data_clear()
+    temp.matrix_basis = mathutils.Matrix.Identity(4)
+    collection.objects.link(temp)
+
+    try:
+        temp.select_set(True)
+        bpy.ops.export_scene.gltf(filepath=file_path, **gltf_options)
+    finally:
+        bpy.data.objects.remove(temp)
@@ -0,0 +1,53 @@
+""" Entry point for the background blender processes used to export GLTF
+files in parallel (see gltf.export_parallel). It is run as:
+
+    blender --background scene.blend --python gltf_worker.py -- job.json
+
+The job file lists the objects to export and where to write them. The result
+of each export is written to the results file named in the job, in the same
+order as the jobs.
+"""
+import os
+import sys
+import json
+import importlib
+import traceback
+
+import bpy
+
+
+def main(job_path):
+    """Export everything in the job file, recording the result of each"""
+    with open(job_path, encoding="utf-8") as job_file:
+        job = json.load(job_file)
+
+    sys.path.insert(0, job["package_parent"])
+    gltf = importlib.import_module(job["package"] + ".gltf")
+
+    bpy.ops.object.select_all(action="DESELECT")
+
+    results = []
+    with gltf.export_collection() as collection:
+        for item in job["jobs"]:
+            try:
+                gltf.export_object(
+                    bpy.data.objects[item["object"]],
+                    os.path.join(job["output_folder"], item["path"]),
+                    job["gltf_options"],
+                    collection,
+                )
+                error = None
+            except Exception:  # pylint: disable=W0703
+                error = traceback.format_exc().strip().splitlines()[-1]
+            results.append(
+                {"index": item["index"], "path": item["path"], "error": error}
+            )
+
+    with open(job["results"], "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file)
+
+    return all(r["error"] is None for r in results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv[sys.argv.index("--") + 1]) else 1)
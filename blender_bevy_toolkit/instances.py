@@ -0,0 +1,246 @@
+""" Exports the instances generated by geometry nodes, particle systems and
+instancing on faces or vertices.
+
+These instances are not objects in the scene, so they are read from the
+evaluated depsgraph. There can be hundreds of thousands of them (eg blades
+of grass), so rather than exporting an entity for each, the instances are
+grouped by the mesh they instance. The transforms of each group are written
+to a binary buffer file, and the scene gets one entity per group with an
+InstanceBuffer component referencing the buffer and the mesh's GLTF file,
+so that bevy can draw the group with a single instanced draw. If the scene
+is split into grid cells (see chunks.py), each group is split by cell too.
+
+A buffer file is a header followed by the transforms:
+
+    MAGIC       4 bytes
+    VERSION     u32
+    count       u32
+    stride      u32, the number of f32 per instance (INSTANCE_STRIDE)
+    transforms  count * stride f32
+
+Everything is little endian. Each transform is the translation, rotation
+(wxyz) and scale of an instance in world space, in the same order and with
+the same conversion to Y-up as the Transform component.
+"""
+import os
+import time
+import struct
+import logging
+
+from . import gltf, prefabs, rust_types, transforms
+from .utils import jdict, scene_path
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"BINS"
+VERSION = 1
+
+# tx, ty, tz, rw, rx, ry, rz, sx, sy, sz
+INSTANCE_STRIDE = 10
+
+_HEADER = struct.Struct("<4sIII")
+
+
+class InstanceGroup:
+    """The instances of one object's mesh: the object they instance and
+    the world matrix of each instance"""
+
+    def __init__(self, source):
+        self.source = source
+        self.matrices = []
+
+
+class WrittenBuffer:
+    """A buffer file that has been written: the paths (relative to the main
+    scene file) of the mesh and of the buffer, the number of instances, the
+    grid cell (see chunks.py) of the instances in it if the scene is split
+    into cells, and the bounds of their origins"""
+
+    def __init__(self, mesh_path, buffer_path, count, cell, minimum, maximum):
+        self.mesh_path = mesh_path
+        self.buffer_path = buffer_path
+        self.count = count
+        self.cell = cell
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def component(self, config):
+        """The InstanceBuffer component for the buffer, with paths relative
+        to the scene file config is writing"""
+        return instance_buffer(
+            scene_path(config, self.mesh_path),
+            scene_path(config, self.buffer_path),
+            self.count,
+        )
+
+
+def buffer_file(config, source, cell=None):
+    """The path of the buffer file for the instances of an object (in a
+    grid cell), relative to the scene file. It is named after the object's
+    GLTF file, which gltf.asset_name keeps unique"""
+    folder = config.get("instance_output_folder", "instances")
+    name = gltf.asset_name(config, source)
+    if cell is not None:
+        name += f"_{cell[0]}_{cell[1]}"
+    return f"{folder}/{name}.bin"
+
+
+def collect_instances(config, depsgraph):
+    """Group the instances in an evaluated depsgraph by the mesh they
+    instance. Returns a dict of mesh asset path -> InstanceGroup, and the
+    number of instances that were skipped because they have no mesh to
+    reference"""
+    skip_prefabs = config.get("export_prefabs", True)
+    groups = {}
+    # Maps source object -> its InstanceGroup, or None if it is skipped
+    sources = {}
+    instancers = {}
+    skipped = 0
+
+    for instance in depsgraph.object_instances:
+        if not instance.is_instance:
+            continue
+
+        instancer = instance.parent.original
+        wanted = instancers.get(instancer)
+        if wanted is None:
+            # Collections instanced by an object are exported as prefabs
+            wanted = not (skip_prefabs and prefabs.is_instancer(instancer))
+            instancers[instancer] = wanted
+        if not wanted:
+            continue
+
+        source = instance.object.original
+        if source not in sources:
+            group = None
+            # Geometry that geometry nodes instance directly (rather than
+            # from an object) has no object of its own to export
+            if source is not instancer and gltf.has_asset(source):
+                path = gltf.asset_path(config, source)
+                group = groups.get(path)
+                if group is None:
+                    group = groups[path] = InstanceGroup(source)
+            sources[source] = group
+
+        group = sources[source]
+        if group is None:
+            skipped += 1
+            continue
+        # The instance is only valid while iterating, so the matrix is copied
+        group.matrices.append(instance.matrix_world.copy())
+
+    return groups, skipped
+
+
+def write_buffer(file_path, values):
+    """Write an (N, INSTANCE_STRIDE) array of transforms to a buffer file"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as outfile:
+        outfile.write(_HEADER.pack(MAGIC, VERSION, len(values), INSTANCE_STRIDE))
+        outfile.write(values.astype("<f4").tobytes())
+
+
+def instance_buffer(mesh_path, buffer_path, count):
+    """The component for the entity that draws a group of instances
+
+    {
+        "type": "blender_bevy_toolkit::InstanceBuffer",
+        "struct": {
+            "mesh": {
+                "type": "alloc::string::String",
+                "value": "meshes/Grass_40ae9c3d.glb",
+            },
+            "buffer": {
+                "type": "alloc::string::String",
+                "value": "instances/Grass_40ae9c3d.bin",
+            },
+            "count": {
+                "type": "u32",
+                "value": 120000,
+            },
+        },
+    },
+    """
+    return rust_types.Map(
+        type="blender_bevy_toolkit::InstanceBuffer",
+        struct=rust_types.Map(
+            mesh=rust_types.String(mesh_path),
+            buffer=rust_types.String(buffer_path),
+            count=rust_types.Map(type="u32", value=rust_types.Int(count)),
+        ),
+    )
+
+
+def split_cells(matrices, size):
+    """Split (N, 4, 4) [column][row] matrices by the grid cell (see
+    chunks.py) that their translation is in. Returns a dict of cell ->
+    matrices"""
+    numpy = transforms.numpy
+    # As chunks.cell_key computes them, in double precision
+    keys = numpy.floor(matrices[:, 3, :2].astype(numpy.float64) / size)
+    cells, inverse = numpy.unique(keys.astype(numpy.int64), axis=0, return_inverse=True)
+    order = numpy.argsort(inverse.reshape(-1), kind="stable")
+    rows = numpy.split(order, numpy.cumsum(numpy.bincount(inverse.reshape(-1)))[:-1])
+    return {(int(x), int(y)): matrices[r] for (x, y), r in zip(cells, rows)}
+
+
+def export_instances(config, depsgraph):
+    """Write a buffer file for each group of instances in the depsgraph, or
+    for each group in each grid cell if config["chunk_size"] is set.
+    Returns a WrittenBuffer for each file, and stores the instanced objects
+    in config["instance_sources"] so that their meshes can be exported too"""
+    config["instance_sources"] = []
+    if transforms.numpy is None:
+        logger.warning(jdict(event="export_instances_needs_numpy"))
+        return []
+
+    start = time.perf_counter()
+    groups, skipped = collect_instances(config, depsgraph)
+    read_seconds = time.perf_counter() - start
+
+    written = []
+    total = 0
+    for mesh_path, group in groups.items():
+        # mathutils matrices are [row][column], transforms.py's are the
+        # other way around
+        matrices = transforms.numpy.array(
+            group.matrices, dtype=transforms.numpy.float32
+        ).transpose(0, 2, 1)
+        if config.get("chunk_size"):
+            cells = split_cells(matrices, config["chunk_size"])
+        else:
+            cells = {None: matrices}
+
+        for cell, cell_matrices in cells.items():
+            buffer_path = buffer_file(config, group.source, cell)
+            write_buffer(
+                os.path.join(config["output_folder"], buffer_path),
+                transforms.transform_values(cell_matrices),
+            )
+            origins = cell_matrices[:, 3, :3]
+            written.append(
+                WrittenBuffer(
+                    mesh_path,
+                    buffer_path,
+                    len(cell_matrices),
+                    cell,
+                    origins.min(axis=0).tolist(),
+                    origins.max(axis=0).tolist(),
+                )
+            )
+        config["instance_sources"].append(group.source)
+        total += len(matrices)
+
+    logger.info(
+        jdict(
+            event="export_instances",
+            instances=total,
+            groups=len(groups),
+            files=len(written),
+            skipped=skipped,
+            read_seconds=read_seconds,
+            seconds=time.perf_counter() - start,
+        )
+    )
+    return written
@@ -0,0 +1,56 @@
+""" Exports instanced collections as prefabs.
+
+An object that instances a collection is exported as a single entity with a
+PrefabInstance component that references a scene file of the collection,
+rather than as a copy of every object in the collection. Each collection
+that is instanced is exported once, to config["prefab_output_folder"], with
+its objects positioned relative to the collection's instance offset. Spawning
+the prefab as a child of the instancing entity then puts it where blender
+shows it.
+"""
+import os
+import bpy
+
+from . import compression
+from .utils import short_hash
+
+
+def is_instancer(obj):
+    """Returns true if the object instances a collection"""
+    return obj.instance_type == "COLLECTION" and obj.instance_collection is not None
+
+
+def prefab_file(config, collection):
+    """The path of the prefab file for a collection, relative to the scene
+    file. It has the same extension (and compression) as the scene file.
+    Different names can clean to the same name (and linked collections can
+    share one), so the name is made unique with a hash of the full name"""
+    extension = os.path.splitext(config["output_filepath"])[1] or ".scn"
+    name = bpy.path.clean_name(collection.name)
+    filename = f"{name}_{short_hash('Collection', collection.name_full)}{extension}"
+    codec = compression.get_codec(config)
+    if codec is not None:
+        filename += codec.extension
+    return f"{config.get('prefab_output_folder', 'prefabs')}/{filename}"
+
+
+def instanced_collections(objects):
+    """The collections instanced by the objects, and by the objects in those
+    collections, each once and in the order they are first seen"""
+    collections = {}
+    # The list grows with the objects of each new collection as it is walked
+    pending = list(objects)
+    for obj in pending:
+        if is_instancer(obj) and obj.instance_collection not in collections:
+            collections[obj.instance_collection] = None
+            pending.extend(obj.instance_collection.all_objects)
+    return list(collections)
+
+
+def prefab_objects(objects):
+    """Every object in the collections instanced by the objects (eg to
+    export their meshes too)"""
+    found = {}
+    for collection in instanced_collections(objects):
+        found.update(dict.fromkeys(collection.all_objects))
+    return list(found)
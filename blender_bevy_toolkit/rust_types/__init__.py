@@ -1,8 +1,7 @@
 """ Handles encoding types (vectors, floats) from blender formats into
 bevy-reflected formats serialized with RON """
-import mathutils
-from . import ron
-from .ron import Str, Int, EnumValue, Map, List, Base
+from . import ron, binary
+from .ron import Str, Int, EnumValue, Map, List, Base, Slot, Template
 
 
 def reflect(type_path, processor):
@@ -10,32 +9,37 @@ def reflect(type_path, processor):
     for the specified type, using the passed in "processor" function
     to pre-process the value"""
 
-    class ReflectedType(Base):
+    class ReflectedType(ron.TypedValue):
         """Bevy reflects structs as maps"""
 
-        def __init__(self, value):
-            self.value = value
+        __slots__ = ()
+
+        # Converts a value into what gets encoded, eg when filling a template
+        # slot that was created with ReflectedType(Slot(...))
+        process = staticmethod(processor)
 
-        def to_str(self, indent):
-            return ron.encode(
-                ron.Map(type=type_path, value=processor(self.value)), indent
-            )
+        def __init__(self, value):
+            # Slots stand in for the already processed value
+            if value.__class__ is not ron.Slot:
+                value = processor(value)
+            super().__init__(type_path, value)
 
     return ReflectedType
 
 
 Quat = reflect(
-    "glam::f32::sse2::quat::Quat", lambda quat: ron.Tuple(quat[1], quat[2], quat[3], quat[0])
+    "glam::f32::sse2::quat::Quat", lambda quat: ron.Vector(quat[1], quat[2], quat[3], quat[0])
 )
-Vec2 = reflect("glam::vec2::Vec2", lambda vec: ron.Tuple(vec[0], vec[1]))
-Vec3 = reflect("glam::f32::vec3", lambda vec: ron.Tuple(vec[0], vec[1], vec[2]))
-Vec4 = reflect("glam::vec4::Vec4", lambda vec: ron.Tuple(vec.x, vec.y, vec.z, vec.w))
+Vec2 = reflect("glam::vec2::Vec2", lambda vec: ron.Vector(vec[0], vec[1]))
+Vec3 = reflect("glam::f32::vec3", lambda vec: ron.Vector(vec[0], vec[1], vec[2]))
+Vec4 = reflect("glam::vec4::Vec4", lambda vec: ron.Vector(vec.x, vec.y, vec.z, vec.w))
 BoolVec3 = reflect(
     "glam::vec3::IVec3", lambda vec: ron.Tuple(int(vec[0]), int(vec[1]), int(vec[2]))
 )
 F32 = reflect("f32", ron.Float)
 F64 = reflect("f64", ron.Float)
 Bool = reflect("bool", ron.Bool)
+String = reflect("alloc::string::String", ron.Str)
 RgbaLinear = reflect(
     "bevy_render::color::Color",
     lambda col: ron.EnumValue(
@@ -45,37 +49,30 @@ RgbaLinear = reflect(
 Entity = reflect("bevy_ecs::entity::Entity", lambda x: x)
 
 
-class Enum(Base):
+class Enum(ron.TypedValue):
     """Reflected Enum that describes both type and value"""
 
+    __slots__ = ()
+
     def __init__(self, contained_type, value):
-        self.contained_type = contained_type
-        self.value = value
-
-    def to_str(self, indent):
-        return ron.encode(
-            ron.Map(
-                type=self.contained_type,
-                value=self.value,
-            ),
-            indent,
-        )
+        super().__init__(contained_type, value)
+
+    @property
+    def contained_type(self):
+        """The type path of the enum"""
+        return self.type_path
 
 
-class Option(Base):
+class Option(ron.TypedValue):
     """Reflected Rust option. None or Some(value)"""
 
+    __slots__ = ("contained_type",)
+
     def __init__(self, contained_type, value):
-        self.contained_type = contained_type
-        self.value = value
-
-    def to_str(self, indent):
-        return ron.encode(
-            ron.Map(
-                type=f"core::option::Option<{self.contained_type}>",
-                value=ron.EnumValue("None")
-                if self.value is None
-                else ron.EnumValue("Some", ron.Tuple(self.value)),
-            ),
-            indent,
+        super().__init__(
+            f"core::option::Option<{contained_type}>",
+            ron.EnumValue("None")
+            if value is None
+            else ron.EnumValue("Some", ron.Tuple(value)),
         )
+        self.contained_type = contained_type
@@ -0,0 +1,371 @@
+""" Benchmarks for the RON encoder using synthetic scenes.
+
+The scenes are made of entities with the same component trees that the
+exporter produces (Transform, GlobalTransform, lights, cameras, visibility...)
+built from the rust_types wrappers, so no blender is needed. Run from the
+blender_bevy_toolkit folder with:
+
+    python -m rust_types.bench_ron
+    python -m rust_types.bench_ron --sizes 1000 1000000 --repeat 3
+
+For each scene size it reports the time to encode, the size of the output,
+the throughput and the peak memory used while encoding.
+"""
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+import collections
+
+from . import ron, Map, List, Int, F32, Bool, Quat, RgbaLinear, Option, Entity
+from . import Slot, Template
+
+
+Color = collections.namedtuple("Color", ["r", "g", "b"])
+
+
+def transform_tree(rng):
+    """Same shape as definitions/bevy_transform/transform.py, built as a tree
+    of nodes"""
+    return Map(
+        type="bevy_transform::components::transform::Transform",
+        struct=Map(
+            translation=Map(
+                type="glam::f32::vec3::Vec3",
+                struct=Map(
+                    x=F32(rng.uniform(-100, 100)),
+                    y=F32(rng.uniform(-100, 100)),
+                    z=F32(rng.uniform(-100, 100)),
+                ),
+            ),
+            rotation=Quat([rng.random() for _ in range(4)]),
+            scale=Map(
+                type="glam::f32::vec3::Vec3",
+                struct=Map(
+                    x=F32(rng.uniform(0.5, 2)),
+                    y=F32(rng.uniform(0.5, 2)),
+                    z=F32(rng.uniform(0.5, 2)),
+                ),
+            ),
+        ),
+    )
+
+
+def vec3_shape(type_path, prefix):
+    """A vector with a template slot for each component"""
+    return Map(
+        type=type_path,
+        struct=Map(
+            x=F32(Slot(prefix + "x")),
+            y=F32(Slot(prefix + "y")),
+            z=F32(Slot(prefix + "z")),
+        ),
+    )
+
+
+TRANSFORM = Template(
+    Map(
+        type="bevy_transform::components::transform::Transform",
+        struct=Map(
+            translation=vec3_shape("glam::f32::vec3::Vec3", "t"),
+            rotation=Quat([Slot(f"r{axis}") for axis in "wxyz"]),
+            scale=vec3_shape("glam::f32::vec3::Vec3", "s"),
+        ),
+    )
+)
+
+
+def transform_template(rng):
+    """Same as transform_tree, filling in a template as the definition does"""
+    return TRANSFORM.fill(
+        tx=rng.uniform(-100, 100),
+        ty=rng.uniform(-100, 100),
+        tz=rng.uniform(-100, 100),
+        **{f"r{axis}": rng.random() for axis in "wxyz"},
+        sx=rng.uniform(0.5, 2),
+        sy=rng.uniform(0.5, 2),
+        sz=rng.uniform(0.5, 2),
+    )
+
+
+def global_transform_tree(rng):
+    """Same shape as definitions/bevy_transform/global_transform.py, built as
+    a tree of nodes"""
+
+    def vec3a(x, y, z):
+        return Map(
+            type="glam::f32::sse2::vec3a::Vec3A",
+            struct=Map(x=F32(x), y=F32(y), z=F32(z)),
+        )
+
+    values = [rng.uniform(-1, 1) for _ in range(12)]
+    return Map(
+        type="bevy_transform::components::global_transform::GlobalTransform",
+        tuple_struct=List(
+            Map(
+                type="glam::f32::affine3a::Affine3A",
+                struct=Map(
+                    matrix3=Map(
+                        type="glam::f32::sse2::mat3a::Mat3A",
+                        struct=Map(
+                            x_axis=vec3a(*values[0:3]),
+                            y_axis=vec3a(*values[3:6]),
+                            z_axis=vec3a(*values[6:9]),
+                        ),
+                    ),
+                    translation=vec3a(*values[9:12]),
+                ),
+            ),
+        ),
+    )
+
+
+VEC3A = "glam::f32::sse2::vec3a::Vec3A"
+GLOBAL_TRANSFORM = Template(
+    Map(
+        type="bevy_transform::components::global_transform::GlobalTransform",
+        tuple_struct=List(
+            Map(
+                type="glam::f32::affine3a::Affine3A",
+                struct=Map(
+                    matrix3=Map(
+                        type="glam::f32::sse2::mat3a::Mat3A",
+                        struct=Map(
+                            x_axis=vec3_shape(VEC3A, "x_axis_"),
+                            y_axis=vec3_shape(VEC3A, "y_axis_"),
+                            z_axis=vec3_shape(VEC3A, "z_axis_"),
+                        ),
+                    ),
+                    translation=vec3_shape(VEC3A, "w_axis_"),
+                ),
+            ),
+        ),
+    )
+)
+
+
+def global_transform_template(rng):
+    """Same as global_transform_tree, filling in a template"""
+    values = {}
+    for axis in ("x_axis", "y_axis", "z_axis", "w_axis"):
+        for name in "xyz":
+            values[f"{axis}_{name}"] = rng.uniform(-1, 1)
+    return GLOBAL_TRANSFORM.fill(**values)
+
+
+def empty_component(type_path):
+    """Components such as VisibleEntities and Frustum have no fields"""
+    return Map(type=type_path, struct=Map())
+
+
+def visibility(rng):
+    """Same shape as definitions/bevy_render/visibility.py"""
+    visible = rng.random() > 0.1
+    return [
+        Map(
+            type="bevy_render::view::visibility::ComputedVisibility",
+            struct=Map(
+                is_visible_in_hierarchy=Bool(visible),
+                is_visible_in_view=Bool(visible),
+            ),
+        ),
+        Map(
+            type="bevy_render::view::visibility::Visibility",
+            struct=Map(is_visible=Bool(visible)),
+        ),
+    ]
+
+
+def point_light(rng):
+    """Same shape as definitions/bevy_pbr/point_light.py"""
+    return [
+        empty_component("bevy_render::primitives::CubemapFrusta"),
+        empty_component("bevy_pbr::bundle::CubemapVisibleEntities"),
+        Map(
+            type="bevy_pbr::light::PointLight",
+            struct=Map(
+                color=RgbaLinear(Color(rng.random(), rng.random(), rng.random())),
+                intensity=F32(rng.uniform(10, 1000)),
+                range=F32(rng.uniform(1, 40)),
+                radius=F32(rng.uniform(0, 1)),
+                shadows_enabled=Bool(rng.random() > 0.5),
+                shadow_depth_bias=F32(0.02),
+                shadow_normal_bias=F32(0.6),
+            ),
+        ),
+    ]
+
+
+def camera(rng):
+    """Same shape as definitions/bevy_render/camera.py"""
+    return [
+        Map(
+            type="bevy_render::camera::camera::Camera",
+            struct=Map(
+                near=F32(0.1),
+                far=F32(rng.uniform(100, 1000)),
+                name=Option("alloc::string::String", "camera_3d"),
+            ),
+        ),
+        empty_component("bevy_render::primitives::Frustum"),
+        Map(
+            type="bevy_render::camera::projection::PerspectiveProjection",
+            struct=Map(near=F32(0.1), far=F32(1000.0), fov=F32(rng.uniform(0.5, 1.5))),
+        ),
+        empty_component("bevy_render::view::visibility::VisibleEntities"),
+    ]
+
+
+def parent(parent_id):
+    """Same shape as definitions/bevy_hierarchy/parent.py"""
+    return Map(
+        type="bevy_hierarchy::components::parent::Parent",
+        tuple_struct=List(Entity(parent_id)),
+    )
+
+
+def make_entity(rng, entity_id, templates=True, interned=True):
+    """An entity with a realistic mix of components: mostly meshes, with
+    some lights and cameras, and some of them parented. The transforms are
+    either filled in templates or trees of nodes, and the components that
+    the definitions mark as interned are optionally interned"""
+    if templates:
+        global_transform, transform = global_transform_template, transform_template
+    else:
+        global_transform, transform = global_transform_tree, transform_tree
+
+    components = [global_transform(rng)]
+    kind = rng.random()
+    if kind < 0.05:
+        others = camera(rng)
+    elif kind < 0.2:
+        others = point_light(rng)
+    else:
+        others = visibility(rng)
+    if interned:
+        others = [ron.intern(c) for c in others]
+    components += others
+    if entity_id > 0 and rng.random() < 0.1:
+        components.append(parent(rng.randrange(entity_id)))
+    components.append(transform(rng))
+
+    return ron.Struct(entity=Int(entity_id), components=List(*components))
+
+
+def make_scene(size, seed=0, templates=True, interned=True):
+    """A list of entities, as written by the exporter"""
+    rng = random.Random(seed)
+    return List(*(make_entity(rng, i, templates, interned) for i in range(size)))
+
+
+class CountingSink:
+    """A file-like object that throws away what is written to it, so that
+    streaming can be measured without disk IO"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        """Count but don't store"""
+        self.size += len(text)
+
+
+def encode_string(scene):
+    """Encode the whole scene into one string. Returns the output size"""
+    return len(ron.encode(scene))
+
+
+def encode_stream(scene):
+    """Stream the scene into a sink. Returns the output size"""
+    sink = CountingSink()
+    ron.encode_to(sink, scene)
+    return sink.size
+
+
+MODES = {
+    "encode": encode_string,
+    "encode_to": encode_stream,
+}
+
+
+def run(sizes, repeat, measure_memory, templates=True, interned=True, out=sys.stdout):
+    """Run each mode on each scene size, printing a row per combination"""
+    out.write(
+        f"{'entities':>10} {'mode':>10} {'seconds':>10} {'MB':>10} "
+        f"{'MB/s':>10} {'peak MB':>10}\n"
+    )
+    for size in sizes:
+        scene = make_scene(size, templates=templates, interned=interned)
+        for name, mode in MODES.items():
+            timings = []
+            for _ in range(repeat):
+                # Each run starts without any previously interned text
+                ron.INTERNED.clear()
+                start = time.perf_counter()
+                output_size = mode(scene)
+                timings.append(time.perf_counter() - start)
+            seconds = min(timings)
+
+            peak = float("nan")
+            if measure_memory:
+                # Measured separately as tracing slows everything down
+                tracemalloc.start()
+                mode(scene)
+                peak = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+
+            megabytes = output_size / 1e6
+            out.write(
+                f"{size:>10} {name:>10} {seconds:>10.3f} {megabytes:>10.2f} "
+                f"{megabytes / seconds:>10.2f} {peak:>10.2f}\n"
+            )
+            out.flush()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Numbers of entities to benchmark (eg 1000000 for a huge level)",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Best of N runs")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Skip measuring peak memory"
+    )
+    parser.add_argument(
+        "--indent", type=int, default=ron.INDENT_SIZE, help="ron.INDENT_SIZE to use"
+    )
+    parser.add_argument(
+        "--no-templates",
+        action="store_true",
+        help="Build transforms as trees of nodes rather than filled templates",
+    )
+    parser.add_argument(
+        "--no-intern", action="store_true", help="Don't intern any components"
+    )
+    parser.add_argument(
+        "--float-precision",
+        choices=list(ron.FLOAT_FORMATS),
+        default=ron.FLOAT_PRECISION,
+        help="ron.FLOAT_PRECISION to use",
+    )
+    args = parser.parse_args(argv)
+
+    ron.INDENT_SIZE = args.indent
+    ron.FLOAT_PRECISION = args.float_precision
+    run(
+        args.sizes,
+        args.repeat,
+        not args.no_memory,
+        not args.no_templates,
+        not args.no_intern,
+    )
+
+
+if __name__ == "__main__":
+    main()
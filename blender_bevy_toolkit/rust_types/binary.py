@@ -0,0 +1,432 @@
+""" A compact binary alternative to RON for the same data.
+
+The values are the same rust_types/ron nodes that are encoded as RON, so a
+scene can be written in either format from one description of it:
+
+```
+binary.encode(ron.Map(type="f32", value=1.5))
+```
+
+The format is a header (MAGIC and a VERSION byte) followed by one value.
+Each value is a tag byte followed by its contents:
+
+    FALSE, TRUE
+    INT       zigzag varint
+    FLOAT64   little endian double (or FLOAT32 if ron.FLOAT_PRECISION is f32)
+    STR       varint length, utf-8 bytes
+    LIST      varint count, values           (ron.List)
+    TUPLE     varint count, values           (ron.Tuple, ron.Vector)
+    STRUCT    varint count, (symbol, value)s (ron.Struct)
+    MAP       varint count, (symbol, value)s (ron.Map)
+    ENUM_UNIT symbol                         (ron.EnumValue without a value)
+    ENUM      symbol, value                  (ron.EnumValue)
+    TYPED     symbol, value                  (ron.TypedValue, Map(type, value))
+
+Symbols are the strings that repeat (type paths, field names, variants).
+The first time a symbol is seen it is written as a varint of (length << 1)
+followed by the utf-8 bytes, and it is given the next index in the table.
+After that it is written as the varint ((index << 1) | 1).
+
+`decode` reads the format back into ron nodes. It is the reference for
+readers of the format, and is used to test that nothing is lost.
+`iter_list_from` reads the items of a document that is a list (eg a scene)
+one at a time from a stream.
+"""
+import struct
+
+from . import ron
+
+
+MAGIC = b"BSCN"
+VERSION = 1
+
+FALSE = 1
+TRUE = 2
+INT = 3
+FLOAT64 = 4
+FLOAT32 = 5
+STR = 6
+LIST = 7
+TUPLE = 8
+STRUCT = 9
+MAP = 10
+ENUM_UNIT = 11
+ENUM = 12
+TYPED = 13
+
+_FLOAT64 = struct.Struct("<d")
+_FLOAT32 = struct.Struct("<f")
+
+# How many bytes to collect before writing them to a stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class Encoder:
+    """Writes values to a stream, remembering the symbols written so far"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
+        self.symbols = {}
+        # The values for the Slots of the templates being written
+        self.slot_values = []
+        if ron.FLOAT_PRECISION == "f32":
+            self.float_tag, self.float_struct = FLOAT32, _FLOAT32
+        else:
+            self.float_tag, self.float_struct = FLOAT64, _FLOAT64
+
+    def header(self):
+        """Write the magic number and version"""
+        self.buffer += MAGIC
+        self.buffer.append(VERSION)
+
+    def flush(self):
+        """Write out everything collected so far"""
+        self.stream.write(bytes(self.buffer))
+        self.buffer.clear()
+
+    def varint(self, value):
+        """Unsigned LEB128"""
+        buffer = self.buffer
+        while value > 0x7F:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def symbol(self, text):
+        """Write a string that is likely to repeat"""
+        index = self.symbols.get(text)
+        if index is None:
+            self.symbols[text] = len(self.symbols)
+            encoded = text.encode("utf-8")
+            self.varint(len(encoded) << 1)
+            self.buffer += encoded
+        else:
+            self.varint((index << 1) | 1)
+
+    def value(self, node):
+        """Write any value that ron.encode can encode (except Raw text)"""
+        method = _METHODS.get(node.__class__) or _find_method(node.__class__)
+        method(self, node)
+        if len(self.buffer) > STREAM_CHUNK_SIZE:
+            self.flush()
+
+    def _bool(self, node):
+        self.buffer.append(TRUE if node else FALSE)
+
+    def _int(self, node):
+        value = int(node)
+        self.buffer.append(INT)
+        self.varint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+    def _float(self, node):
+        self.buffer.append(self.float_tag)
+        self.buffer += self.float_struct.pack(node)
+
+    def _str(self, node):
+        encoded = node.encode("utf-8")
+        self.buffer.append(STR)
+        self.varint(len(encoded))
+        self.buffer += encoded
+
+    def _leaf(self, node):
+        self.value(node.value)
+
+    def _raw(self, _node):
+        raise TypeError("Raw RON text can't be written in the binary format")
+
+    def _sequence(self, tag, values):
+        self.buffer.append(tag)
+        self.varint(len(values))
+        for value in values:
+            self.value(value)
+
+    def _mapping(self, tag, mapping):
+        self.buffer.append(tag)
+        self.varint(len(mapping))
+        for key, value in mapping.items():
+            self.symbol(key)
+            self.value(value)
+
+    def _list(self, node):
+        self._sequence(LIST, node.values)
+
+    def _tuple(self, node):
+        self._sequence(TUPLE, node.values)
+
+    def _python_list(self, node):
+        self._sequence(LIST, node)
+
+    def _python_tuple(self, node):
+        self._sequence(TUPLE, node)
+
+    def _struct(self, node):
+        self._mapping(STRUCT, node.mapping)
+
+    def _map(self, node):
+        mapping = node.mapping
+        if len(mapping) == 2 and "type" in mapping and "value" in mapping:
+            # Written out by hand rather than with TypedValue in places
+            self.buffer.append(TYPED)
+            self.symbol(mapping["type"])
+            self.value(mapping["value"])
+        else:
+            self._mapping(MAP, mapping)
+
+    def _enum_value(self, node):
+        if node.value is None:
+            self.buffer.append(ENUM_UNIT)
+            self.symbol(node.variant)
+        else:
+            self.buffer.append(ENUM)
+            self.symbol(node.variant)
+            self.value(node.value)
+
+    def _typed_value(self, node):
+        self.buffer.append(TYPED)
+        self.symbol(node.type_path)
+        self.value(node.value)
+
+    def _filled(self, node):
+        self.slot_values.append(node.values)
+        self.value(node.template.shape)
+        self.slot_values.pop()
+
+    def _slot(self, node):
+        self.value(self.slot_values[-1][node.name])
+
+    def _interned(self, node):
+        self.value(node.node)
+
+    def _expanded(self, node):
+        self.value(node.expand())
+
+
+# Maps type -> Encoder method that writes it
+_METHODS = {
+    bool: Encoder._bool,
+    int: Encoder._int,
+    float: Encoder._float,
+    str: Encoder._str,
+    list: Encoder._python_list,
+    tuple: Encoder._python_tuple,
+    ron.Bool: Encoder._leaf,
+    ron.Int: Encoder._leaf,
+    ron.Float: Encoder._leaf,
+    ron.Str: Encoder._leaf,
+    ron.Raw: Encoder._raw,
+    ron.List: Encoder._list,
+    ron.Tuple: Encoder._tuple,
+    ron.Vector: Encoder._tuple,
+    ron.Struct: Encoder._struct,
+    ron.Map: Encoder._map,
+    ron.EnumValue: Encoder._enum_value,
+    ron.TypedValue: Encoder._typed_value,
+    ron.Filled: Encoder._filled,
+    ron.Slot: Encoder._slot,
+    ron.Interned: Encoder._interned,
+}
+
+
+def _find_method(node_type):
+    """Look up how to write a subclass or a type that implements expand, and
+    remember it"""
+    for base in node_type.__mro__:
+        method = _METHODS.get(base)
+        if method is not None:
+            break
+    else:
+        if not hasattr(node_type, "expand"):
+            raise TypeError(f"{node_type.__name__} can't be written in binary")
+        method = Encoder._expanded
+    _METHODS[node_type] = method
+    return method
+
+
+def encode(data):
+    """Encode data as a complete binary document. Returns bytes"""
+    chunks = []
+
+    class Collect:  # pylint: disable=R0903
+        write = chunks.append
+
+    encode_to(Collect, data)
+    return b"".join(chunks)
+
+
+def encode_to(stream, data):
+    """Write data to a binary stream as a complete binary document"""
+    encoder = Encoder(stream)
+    encoder.header()
+    encoder.value(data)
+    encoder.flush()
+
+
+def encode_iter_to(stream, values, count):
+    """Write a document containing a list of count values to the stream.
+    The values can be any iterable (eg a generator), and each one is
+    encoded before the next is requested"""
+    encoder = Encoder(stream)
+    encoder.header()
+    encoder.buffer.append(LIST)
+    encoder.varint(count)
+    written = 0
+    for value in values:
+        encoder.value(value)
+        written += 1
+    if written != count:
+        raise ValueError(f"Expected {count} values but got {written}")
+    encoder.flush()
+
+
+class Decoder:
+    """Reads the values written by an Encoder back into ron nodes"""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.symbols = []
+
+    def byte(self):
+        """Read one byte"""
+        try:
+            value = self.data[self.position]
+        except IndexError:
+            raise ValueError("Unexpected end of data") from None
+        self.position += 1
+        return value
+
+    def read(self, size):
+        """Read size bytes"""
+        end = self.position + size
+        if end > len(self.data):
+            raise ValueError("Unexpected end of data")
+        value = self.data[self.position : end]
+        self.position = end
+        return value
+
+    def header(self):
+        """Check the magic number and version"""
+        if self.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a binary scene")
+        version = self.byte()
+        if version != VERSION:
+            raise ValueError(f"Unsupported binary scene version {version}")
+
+    def varint(self):
+        """Unsigned LEB128"""
+        value = 0
+        shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def symbol(self):
+        """Read a string written by Encoder.symbol"""
+        value = self.varint()
+        if value & 1:
+            try:
+                return self.symbols[value >> 1]
+            except IndexError:
+                raise ValueError(f"Unknown symbol {value >> 1}") from None
+        text = bytes(self.read(value >> 1)).decode("utf-8")
+        self.symbols.append(text)
+        return text
+
+    def value(self):
+        """Read a value"""
+        tag = self.byte()
+        if tag == FALSE:
+            return False
+        if tag == TRUE:
+            return True
+        if tag == INT:
+            value = self.varint()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+        if tag == FLOAT64:
+            return _FLOAT64.unpack(self.read(8))[0]
+        if tag == FLOAT32:
+            return _FLOAT32.unpack(self.read(4))[0]
+        if tag == STR:
+            return bytes(self.read(self.varint())).decode("utf-8")
+        if tag == LIST:
+            return ron.List(*(self.value() for _ in range(self.varint())))
+        if tag == TUPLE:
+            return ron.Tuple(*(self.value() for _ in range(self.varint())))
+        if tag in (STRUCT, MAP):
+            mapping = {}
+            for _ in range(self.varint()):
+                key = self.symbol()
+                mapping[key] = self.value()
+            return ron.Struct(**mapping) if tag == STRUCT else ron.Map(**mapping)
+        if tag == ENUM_UNIT:
+            return ron.EnumValue(self.symbol())
+        if tag == ENUM:
+            variant = self.symbol()
+            return ron.EnumValue(variant, self.value())
+        if tag == TYPED:
+            type_path = self.symbol()
+            return ron.TypedValue(type_path, self.value())
+        raise ValueError(f"Unknown tag {tag} at byte {self.position - 1}")
+
+
+class StreamDecoder(Decoder):
+    """A Decoder that reads its data from a stream a chunk at a time"""
+
+    def __init__(self, stream, chunk_size=STREAM_CHUNK_SIZE):
+        super().__init__(b"")
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    def fill(self, size):
+        """Read from the stream until size bytes are available. Returns false
+        if the stream ends first"""
+        while len(self.data) - self.position < size:
+            chunk = self.stream.read(max(self.chunk_size, size))
+            if not chunk:
+                return False
+            self.data = self.data[self.position :] + chunk
+            self.position = 0
+        return True
+
+    def byte(self):
+        if self.position >= len(self.data) and not self.fill(1):
+            raise ValueError("Unexpected end of data")
+        return super().byte()
+
+    def read(self, size):
+        if not self.fill(size):
+            raise ValueError("Unexpected end of data")
+        return super().read(size)
+
+
+def decode(data):
+    """Read a complete binary document. Returns ron nodes that encode to the
+    same RON as the data that was written"""
+    decoder = Decoder(memoryview(data))
+    decoder.header()
+    value = decoder.value()
+    if decoder.position != len(data):
+        raise ValueError("Unexpected data after the end of the document")
+    return value
+
+
+def decode_from(stream):
+    """Read a complete binary document from a stream"""
+    return decode(stream.read())
+
+
+def iter_list_from(stream):
+    """Generate the items of a binary document that is a list (eg a scene),
+    decoding each one as it is read from the stream"""
+    decoder = StreamDecoder(stream)
+    decoder.header()
+    if decoder.byte() != LIST:
+        raise ValueError("Expected a list")
+    for _ in range(decoder.varint()):
+        yield decoder.value()
+    if decoder.fill(1):
+        raise ValueError("Unexpected data after the end of the document")
@@ -9,14 +9,51 @@ For example, you can construct a tuple with:
 t = ron.Tuple(1,2,3,4)
 ron.encode(t)
 ```
+
+Data with a fixed shape can be compiled once into a `Template` with `Slot`s
+for the values, so that each instance only has to fill in the slots.
+
+Floats are written the way python prints them unless FLOAT_PRECISION is set
+to "f32", in which case the shortest text that reads back as the same single
+precision float is used. Tuples of numbers can be made with `Vector`, which
+formats all of its numbers at once (using numpy when it is available).
+
+For large documents, `encode_to` writes the same output into a file-like
+object piece by piece rather than building it up as a single string.
+
+The encoder walks the data with an explicit stack rather than recursing, and
+finds how to encode each node from a table keyed by its type. Encoded pieces
+are collected in a list and joined once at the end.
 """
+import os
+import re
+import sys
+import math
+import struct
+import weakref
+import itertools
 from abc import ABCMeta
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 INDENT_SIZE = 1
 INDENT_CHAR = "\t"
 
 
+# How many pieces of output to collect before writing them to a stream
+STREAM_CHUNK_SIZE = 4096
+
+# How floats are written. "f64" is python's repr, the shortest text that
+# reads back as the same double. "f32" is the shortest text that reads back
+# as the same single precision float, which is what bevy stores them as, and
+# is usually a lot shorter (eg 0.1 rather than 0.10000000149011612)
+FLOAT_PRECISION = "f64"
+
+
 def ind(indent_level):
     """Create indent string"""
     if INDENT_SIZE == 0:
@@ -25,44 +62,53 @@ def ind(indent_level):
 
 
 class Base(metaclass=ABCMeta):
-    """Convert into a rust/ron type"""
+    """Convert into a rust/ron type.
+
+    Subclasses outside this module can either implement to_str, or implement
+    expand to return the ron types (Map, Tuple etc.) that they are encoded as.
+    expand is preferred as the encoder can then continue without recursing.
+
+    The types here define __reduce__ so that they pickle compactly (eg to be
+    encoded in another process)"""
+
+    __slots__ = ()
 
     def to_str(self, indent):
         """Do Serialization"""
 
 
+def _restore_mapping(cls, mapping):
+    return cls(**mapping)
+
+
 class List(Base):
     """List"""
 
+    __slots__ = ("values",)
+
     def __init__(self, *values):
         self.values = values
 
+    def __reduce__(self):
+        return (self.__class__, self.values)
+
     def to_str(self, indent):
-        if not self.values:
-            return "[]"
-        indc = ind(indent + 1)
-        return (
-            f"[{indc}"
-            + f",{indc}".join(encode(d, indent + 1) for d in self.values)
-            + f"{ind(indent)}]"
-        )
+        return encode(self, indent)
 
 
 class Tuple(Base):
     """Tuple"""
 
+    __slots__ = ("values",)
+
     def __init__(self, *values):
         self.values = values
 
+    def __reduce__(self):
+        return (self.__class__, self.values)
+
     def to_str(self, indent):
-        if not self.values:
-            return "()"
-        indc = ind(indent + 1)
-        return (
-            f"({indc}"
-            + f",{indc}".join(encode(d, indent + 1) for d in self.values)
-            + f"{ind(indent)})"
-        )
+        return encode(self, indent)
 
 
 class Struct(Base):
@@ -73,17 +119,16 @@ class Struct(Base):
     )
     """
 
+    __slots__ = ("mapping",)
+
     def __init__(self, **mapping):
         self.mapping = mapping
 
+    def __reduce__(self):
+        return (_restore_mapping, (self.__class__, self.mapping))
+
     def to_str(self, indent):
-        if not self.mapping:
-            return "()"
-        indc = ind(indent + 1)
-        field_string = f",{indc}".join(
-            f"{k}:{encode(v, indent+1)}" for k, v in self.mapping.items()
-        )
-        return f"({indc}{field_string}{ind(indent)})"
+        return encode(self, indent)
 
 
 class Map(Base):
@@ -94,18 +139,16 @@ class Map(Base):
     }
     """
 
+    __slots__ = ("mapping",)
+
     def __init__(self, **mapping):
         self.mapping = mapping
 
+    def __reduce__(self):
+        return (_restore_mapping, (self.__class__, self.mapping))
+
     def to_str(self, indent):
-        if not self.mapping:
-            return "{}"
-        indc = ind(indent + 1)
-        field_string = f",{indc}".join(
-            f"{encode(k, indent+1)}:{encode(v, indent+1)}"
-            for k, v in self.mapping.items()
-        )
-        return f"{{{indc}{field_string}{ind(indent)}}}"
+        return encode(self, indent)
 
 
 class EnumValue(Base):
@@ -117,34 +160,238 @@ class EnumValue(Base):
     EnumValue("Event", Struct(id=3)) => Event{id=3}
     """
 
+    __slots__ = ("variant", "value")
+
     def __init__(self, variant, value=None):
         self.variant = variant
         self.value = value
 
+    def __reduce__(self):
+        return (self.__class__, (self.variant, self.value))
+
     def to_str(self, indent):
-        if self.value is None:
-            return self.variant
-        return self.variant + encode(self.value, indent)
+        return encode(self, indent)
+
+
+class TypedValue(Base):
+    """A value tagged with its type, in the form bevy reflects it:
+    {
+        "type": "type::path",
+        "value": ...,
+    }
+    Encodes the same as the equivalent Map, but the constant text around the
+    value is only built once for each type and indent level"""
+
+    __slots__ = ("type_path", "value")
+
+    def __init__(self, type_path, value):
+        self.type_path = type_path
+        self.value = value
+
+    def __reduce__(self):
+        # Subclasses (eg the ones made by rust_types.reflect) can't always be
+        # pickled, but they all encode the same as a plain TypedValue
+        return (TypedValue, (self.type_path, self.value))
+
+    def to_str(self, indent):
+        return encode(self, indent)
+
+
+class Slot(Base):
+    """A named placeholder for a value in a Template"""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __reduce__(self):
+        return (self.__class__, (self.name,))
+
+    def to_str(self, indent):
+        raise ValueError(f"Slot {self.name!r} can only be encoded as part of a Template")
+
+
+class Template:
+    """A fixed shape of ron types with Slots where the values go. The shape is
+    encoded once (for each indent level it is used at) and split into the
+    constant text and the slots, so that encoding a filled-in template is just
+    a matter of joining the text with the values.
+
+    eg:
+    VEC = Template(Map(type="glam::f32::vec3::Vec3", struct=Map(x=Slot("x"))))
+    ron.encode(VEC.fill(x=1.0))
+    """
+
+    def __init__(self, shape, key=None):
+        self.shape = shape
+        self._compiled = {}
+        self._settings = None
+        self.key = key or (os.getpid(), next(_TEMPLATE_NUMBERS))
+        _TEMPLATES[self.key] = self
+
+    def __reduce__(self):
+        return (_unpickle_template, (self.key, self.shape))
+
+    def compiled(self, level):
+        """The text and slots of the shape encoded at the given level, as
+        a list of strings and (slot name, slot level) tuples"""
+        if self._settings != _SETTINGS:
+            self._compiled = {}
+            self._settings = _SETTINGS
+        key = level if INDENT_SIZE else 0
+        parts = self._compiled.get(key)
+        if parts is None:
+            parts = _compile(self.shape, level)
+            self._compiled[key] = parts
+        return parts
+
+    def fill(self, **values):
+        """Returns a node that encodes as the shape with the slots replaced
+        by the values"""
+        return Filled(self, values)
+
+
+# Every template by the key it was created with
+_TEMPLATES = weakref.WeakValueDictionary()
+_TEMPLATE_NUMBERS = itertools.count()
+
+
+def _unpickle_template(key, shape):
+    """A process forked from the one that created a template already has it,
+    so it is reused (along with its compiled text) rather than duplicated for
+    every pickled node that refers to it"""
+    template = _TEMPLATES.get(key)
+    if template is None:
+        template = Template(shape, key)
+    return template
+
+
+class Filled(Base):
+    """A Template with a value for each of its slots"""
+
+    __slots__ = ("template", "values")
+
+    def __init__(self, template, values):
+        self.template = template
+        self.values = values
+
+    def __reduce__(self):
+        return (self.__class__, (self.template, self.values))
+
+    def to_str(self, indent):
+        return encode(self, indent)
+
+
+class Interned(Base):
+    """A node that is likely to be identical to many others (eg a component
+    with default settings). key is a hashable description of its value (see
+    intern), and nodes with equal keys are only encoded once"""
+
+    __slots__ = ("key", "node")
+
+    def __init__(self, key, node):
+        self.key = key
+        self.node = node
+
+    def __reduce__(self):
+        # The key is usually bigger than the node, and quick to work out again
+        return (intern, (self.node,))
+
+    def to_str(self, indent):
+        return encode(self, indent)
+
+
+class InternTable:
+    """The encoded text of interned nodes, by key and indent level. Counts
+    how many times the text was reused rather than encoded again"""
+
+    def __init__(self, max_entries=65536):
+        self.entries = {}
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Forget all the encoded text and reset the counters"""
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def text(self, node, level):
+        """Returns the text for an Interned node at the given indent level"""
+        key = (node.key, level if INDENT_SIZE else 0)
+        text = self.entries.get(key)
+        if text is None:
+            self.misses += 1
+            out = []
+            _encode_into(node.node, level, out)
+            text = "".join(out)
+            if len(self.entries) < self.max_entries:
+                self.entries[key] = text
+        else:
+            self.hits += 1
+        return text
+
+    def report(self):
+        """Hit/miss counts since the table was last cleared"""
+        return {"intern_hits": self.hits, "intern_misses": self.misses}
+
+
+INTERNED = InternTable()
+
+
+# The characters that are escaped in strings, and their escapes. RON reads
+# Rust's escapes, so other control characters are written as \u{..}
+_ESCAPES = {
+    '"': '\\"',
+    "\\": "\\\\",
+    "\n": "\\n",
+    "\r": "\\r",
+    "\t": "\\t",
+    "\0": "\\0",
+}
+_NEEDS_ESCAPE = re.compile(r'["\\\x00-\x1f\x7f]')
+
+
+def _escape(match):
+    char = match.group()
+    return _ESCAPES.get(char) or f"\\u{{{ord(char):x}}}"
+
+
+def quote(value):
+    """A string in double quotes, escaped the way RON reads it back"""
+    if _NEEDS_ESCAPE.search(value) is None:
+        return '"' + value + '"'
+    return '"' + _NEEDS_ESCAPE.sub(_escape, value) + '"'
 
 
 class Str(Base):
     """&str"""
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return (self.__class__, (self.value,))
+
     def to_str(self, _indent):
-        """repr a string with double quotes. This is probably a fragile
-        hack, so if it breaks, please do something better!"""
-        return '"' + repr("'" + self.value)[2:]
+        return quote(self.value)
 
 
 class Bool(Base):
     """Bool"""
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return (self.__class__, (self.value,))
+
     def to_str(self, _indent):
         if self.value:
             return "true"
@@ -154,9 +401,14 @@ class Bool(Base):
 class Int(Base):
     """i32, u64 etc."""
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return (self.__class__, (self.value,))
+
     def to_str(self, _indent):
         return str(self.value)
 
@@ -164,26 +416,510 @@ class Int(Base):
 class Float(Base):
     """f32, f64, etc..."""
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return (self.__class__, (self.value,))
+
     def to_str(self, _indent):
         return str(self.value)
 
 
-ENCODE_MAP = {
-    str: Str,
-    int: Int,
-    bool: Bool,
-    float: Float,
-    list: List,
-    tuple: Tuple,
+class Vector(Base):
+    """A tuple of numbers, eg the components of a vector or matrix. Encodes
+    the same as a Tuple, but all the numbers are formatted in one go"""
+
+    __slots__ = ("values",)
+
+    def __init__(self, *values):
+        self.values = values
+
+    def __reduce__(self):
+        return (self.__class__, self.values)
+
+    def to_str(self, indent):
+        return encode(self, indent)
+
+
+class Raw(Base):
+    """Text that has already been encoded (eg a cached fragment of a
+    document). It is written out unchanged, so it is up to the creator
+    to ensure it was encoded at the right indent level"""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __reduce__(self):
+        return (self.__class__, (self.text,))
+
+    def to_str(self, _indent):
+        return self.text
+
+
+_SINGLE = struct.Struct("f")
+
+
+def shortest_f32(value):
+    """The shortest text that reads back as the same single precision float
+    as value does, formatted the same way as python formats floats"""
+    if not math.isfinite(value):
+        return str(value)
+    try:
+        single = _SINGLE.unpack(_SINGLE.pack(value))[0]
+    except OverflowError:
+        return str(math.copysign(math.inf, value))
+    for digits in range(1, 10):
+        candidate = float(f"{single:.{digits}g}")
+        if _SINGLE.unpack(_SINGLE.pack(candidate))[0] == single:
+            return repr(candidate)
+    return repr(single)
+
+
+def format_floats(values):
+    """Format a sequence of numbers according to FLOAT_PRECISION. For "f32"
+    the numbers are converted together with numpy if it is available"""
+    if FLOAT_PRECISION == "f64":
+        return [str(value) for value in values]
+    if numpy is None:
+        return [shortest_f32(value) for value in values]
+    with numpy.errstate(over="ignore"):
+        singles = numpy.asarray(values, dtype=numpy.float32)
+    # numpy switches to exponents at different sizes than python does
+    return [repr(float(text)) for text in singles.astype(str).tolist()]
+
+
+# How a single float is formatted for each FLOAT_PRECISION
+FLOAT_FORMATS = {
+    "f64": str,
+    "f32": shortest_f32,
 }
 
 
+# Leaf values don't depend on the indent level, so they are turned into
+# text as soon as they are seen. Maps type -> function(value) -> str
+LEAVES = {
+    str: quote,
+    int: str,
+    float: str,
+    bool: lambda value: "true" if value else "false",
+    Str: lambda node: quote(node.value),
+    Int: lambda node: str(node.value),
+    Float: lambda node: str(node.value),
+    Bool: lambda node: "true" if node.value else "false",
+    Raw: lambda node: node.text,
+}
+
+
+def _push_sequence(values, level, stack, opening, closing):
+    """Push the contents of a list/tuple onto the stack. Runs of leaf values
+    are joined into a single string straight away, so only the nested
+    containers need to be pushed separately. The stack is processed
+    last-in-first-out, so everything is pushed in reverse"""
+    if not values:
+        stack.append(opening + closing)
+        return
+    outer = ind(level)
+    level += 1
+    separator = "," + ind(level)
+    prefix = opening + separator[1:]
+    leaves = LEAVES
+    parts = []
+    pending = []
+    for value in values:
+        leaf = leaves.get(value.__class__)
+        if leaf is None:
+            pending.append(prefix)
+            parts.append("".join(pending))
+            parts.append((value, level))
+            pending = []
+        else:
+            pending.append(prefix + leaf(value))
+        prefix = separator
+    pending.append(outer + closing)
+    parts.append("".join(pending))
+    stack.extend(reversed(parts))
+
+
+def _push_mapping(mapping, level, stack, opening, closing, quote_keys):
+    """Push the contents of a Struct/Map onto the stack in the same way as
+    _push_sequence"""
+    if not mapping:
+        stack.append(opening + closing)
+        return
+    outer = ind(level)
+    level += 1
+    separator = "," + ind(level)
+    prefix = opening + separator[1:]
+    leaves = LEAVES
+    parts = []
+    pending = []
+    for key, value in mapping.items():
+        if quote_keys:
+            key = _quote_key(key)
+        leaf = leaves.get(value.__class__)
+        if leaf is None:
+            pending.append(f"{prefix}{key}:")
+            parts.append("".join(pending))
+            parts.append((value, level))
+            pending = []
+        else:
+            pending.append(f"{prefix}{key}:{leaf(value)}")
+        prefix = separator
+    pending.append(outer + closing)
+    parts.append("".join(pending))
+    stack.extend(reversed(parts))
+
+
+# Map keys are the same few field names over and over again
+_QUOTED_KEYS = {}
+
+
+def _quote_key(key):
+    quoted = _QUOTED_KEYS.get(key)
+    if quoted is None:
+        quoted = encode(key)
+        if len(_QUOTED_KEYS) < 4096:
+            _QUOTED_KEYS[key] = quoted
+    return quoted
+
+
+# Maps (type path, indent level) -> the (prefix, suffix) text around the
+# value of a TypedValue. This, the INTERNED text and compiled templates are
+# only valid for the module settings in _SETTINGS
+_TYPE_HEADERS = {}
+_SETTINGS = None
+
+
+def current_settings():
+    """The module settings that change the encoded text, eg to pass to
+    use_settings in another process"""
+    return (INDENT_SIZE, INDENT_CHAR, FLOAT_PRECISION)
+
+
+def use_settings(settings):
+    """Set the module settings from the result of current_settings"""
+    global INDENT_SIZE, INDENT_CHAR, FLOAT_PRECISION  # pylint: disable=W0603
+    INDENT_SIZE, INDENT_CHAR, FLOAT_PRECISION = settings
+
+
+def _check_settings():
+    """Forget the cached text, and switch how floats are formatted, if the
+    indent or float settings have changed"""
+    global _SETTINGS  # pylint: disable=W0603
+    settings = current_settings()
+    if _SETTINGS != settings:
+        try:
+            float_format = FLOAT_FORMATS[FLOAT_PRECISION]
+        except KeyError:
+            raise ValueError(
+                f"FLOAT_PRECISION must be one of {list(FLOAT_FORMATS)}"
+            ) from None
+        LEAVES[float] = float_format
+        LEAVES[Float] = lambda node: float_format(node.value)
+        for leaf_type in (float, Float):
+            HANDLERS[leaf_type] = _leaf_handler(LEAVES[leaf_type])
+
+        _TYPE_HEADERS.clear()
+        INTERNED.entries.clear()
+        _SETTINGS = settings
+
+
+def _type_header(type_path, level):
+    """Encode the part of a TypedValue before and after its value"""
+    # Without indentation the text is the same at every level
+    key = (type_path, level if INDENT_SIZE else 0)
+    header = _TYPE_HEADERS.get(key)
+    if header is None:
+        indc = ind(level + 1)
+        header = (
+            f'{{{indc}"type":{quote(type_path)},{indc}"value":',
+            ind(level) + "}",
+        )
+        _TYPE_HEADERS[key] = header
+    return header
+
+
+def _encode_typed_value(node, level, append, stack):
+    prefix, suffix = _type_header(node.type_path, level)
+    value = node.value
+    leaf = LEAVES.get(value.__class__)
+    if leaf is None:
+        append(prefix)
+        stack.append(suffix)
+        stack.append((value, level + 1))
+    else:
+        append(prefix + leaf(value) + suffix)
+
+
+def _encode_list(node, level, _append, stack):
+    _push_sequence(node.values, level, stack, "[", "]")
+
+
+def _encode_tuple(node, level, _append, stack):
+    _push_sequence(node.values, level, stack, "(", ")")
+
+
+def _encode_python_list(node, level, _append, stack):
+    _push_sequence(node, level, stack, "[", "]")
+
+
+def _encode_python_tuple(node, level, _append, stack):
+    _push_sequence(node, level, stack, "(", ")")
+
+
+def _encode_struct(node, level, _append, stack):
+    _push_mapping(node.mapping, level, stack, "(", ")", False)
+
+
+def _encode_map(node, level, _append, stack):
+    _push_mapping(node.mapping, level, stack, "{", "}", True)
+
+
+def _encode_enum_value(node, level, append, stack):
+    if node.value is None:
+        append(node.variant)
+    else:
+        # The value follows the variant name at the same indent level
+        stack.append((node.value, level))
+        append(node.variant)
+
+
+def _encode_with_to_str(node, level, append, _stack):
+    append(node.to_str(level))
+
+
+def _encode_expanded(node, level, _append, stack):
+    stack.append((node.expand(), level))
+
+
+def _encode_filled(node, level, append, stack):
+    values = node.values
+    if FLOAT_PRECISION != "f64":
+        # Format all the floats at once rather than one slot at a time
+        names = [name for name, value in values.items() if value.__class__ is float]
+        if len(names) > 1:
+            values = dict(values)
+            for name, text in zip(names, format_floats([values[n] for n in names])):
+                values[name] = Raw(text)
+    leaves = LEAVES
+    parts = []
+    pending = []
+    for part in node.template.compiled(level):
+        if part.__class__ is str:
+            pending.append(part)
+            continue
+        name, slot_level = part
+        value = values[name]
+        leaf = leaves.get(value.__class__)
+        if leaf is None:
+            parts.append("".join(pending))
+            parts.append((value, slot_level))
+            pending = []
+        else:
+            pending.append(leaf(value))
+    if parts:
+        parts.append("".join(pending))
+        stack.extend(reversed(parts))
+    else:
+        append("".join(pending))
+
+
+def _encode_vector(node, level, append, stack):
+    values = node.values
+    for value in values:
+        if value.__class__ not in (float, int):
+            # eg Slots in a template
+            _push_sequence(values, level, stack, "(", ")")
+            return
+    if not values:
+        append("()")
+        return
+    separator = "," + ind(level + 1)
+    append(f"({separator[1:]}{separator.join(format_floats(values))}{ind(level)})")
+
+
+def _encode_interned(node, level, append, _stack):
+    append(INTERNED.text(node, level))
+
+
+# Maps type -> function(node, level, append, stack) that either appends the
+# encoded text to the output, or pushes the parts it is made of (strings or
+# (node, level) pairs) onto the stack to be processed next.
+HANDLERS = {
+    List: _encode_list,
+    Tuple: _encode_tuple,
+    Struct: _encode_struct,
+    Map: _encode_map,
+    EnumValue: _encode_enum_value,
+    TypedValue: _encode_typed_value,
+    Filled: _encode_filled,
+    Interned: _encode_interned,
+    Vector: _encode_vector,
+    list: _encode_python_list,
+    tuple: _encode_python_tuple,
+}
+
+
+def _leaf_handler(leaf):
+    return lambda node, _level, append, _stack: append(leaf(node))
+
+
+for _leaf_type, _leaf_function in LEAVES.items():
+    HANDLERS[_leaf_type] = _leaf_handler(_leaf_function)
+
+
+def _find_handler(node_type):
+    """Look up the handler for a type that isn't directly in the table (eg a
+    subclass, or a type that provides its own to_str), and remember it"""
+    for base in node_type.__mro__:
+        handler = HANDLERS.get(base)
+        if handler is not None:
+            # A subclass that changes how it is serialized takes precedence
+            if getattr(node_type, "to_str", None) is not getattr(base, "to_str", None):
+                handler = _encode_with_to_str
+            break
+    else:
+        if hasattr(node_type, "expand"):
+            handler = _encode_expanded
+        elif hasattr(node_type, "to_str"):
+            handler = _encode_with_to_str
+        else:
+            raise KeyError(node_type)
+    HANDLERS[node_type] = handler
+    return handler
+
+
+def node_key(node):
+    """A hashable value that is equal for nodes that encode to the same text.
+    Leaves are keyed by their text, so eg 0.0 and -0.0 are kept apart.
+    Returns None for nodes whose value can't be inspected (ones that only
+    implement to_str)"""
+    leaf = LEAVES.get(node.__class__)
+    if leaf is not None:
+        return leaf(node)
+
+    handler = HANDLERS.get(node.__class__) or _find_handler(node.__class__)
+    if handler is _encode_expanded:
+        return node_key(node.expand())
+    if handler is _encode_interned:
+        return node.key
+
+    if handler is _encode_typed_value:
+        names, values = (node.type_path,), (node.value,)
+    elif handler is _encode_filled:
+        names, values = (node.template,) + tuple(node.values), node.values.values()
+    elif handler is _encode_enum_value:
+        names = (node.variant,)
+        values = () if node.value is None else (node.value,)
+    elif handler in (_encode_struct, _encode_map):
+        names, values = tuple(node.mapping), node.mapping.values()
+    elif handler in (_encode_list, _encode_tuple, _encode_vector):
+        names, values = (), node.values
+    elif handler in (_encode_python_list, _encode_python_tuple):
+        names, values = (), node
+    else:
+        return None
+
+    keys = tuple(node_key(value) for value in values)
+    if None in keys:
+        return None
+    return (handler, names, keys)
+
+
+def intern(node):
+    """Wrap a node so that its encoded text is shared with every other
+    interned node of the same value. Nodes that can't be keyed are returned
+    unchanged"""
+    _check_settings()
+    key = node_key(node)
+    if key is None:
+        return node
+    return Interned(key, node)
+
+
+def _compile(shape, level):
+    """Encode a Template's shape, leaving the slots as (name, level) tuples
+    between the (merged) pieces of text"""
+    handlers = dict(HANDLERS)
+    handlers[Slot] = lambda node, level, append, _stack: append((node.name, level))
+    out = []
+    _encode_into(shape, level, out, handlers=handlers)
+
+    parts = []
+    for piece in out:
+        if piece.__class__ is str and parts and parts[-1].__class__ is str:
+            parts[-1] += piece
+        else:
+            parts.append(piece)
+    return parts
+
+
+def _encode_into(data, indent, out, stream=None, handlers=None):
+    """Encode data, appending the pieces of text to the out list. If a stream
+    is given, the pieces are written to it (and out is emptied) whenever
+    enough have been collected"""
+    append = out.append
+    stack = [(data, indent)]
+    pop = stack.pop
+    if handlers is None:
+        handlers = HANDLERS
+    limit = sys.maxsize if stream is None else STREAM_CHUNK_SIZE
+    _check_settings()
+
+    while stack:
+        item = pop()
+        if item.__class__ is str:
+            append(item)
+        else:
+            node, level = item
+            handler = handlers.get(node.__class__)
+            if handler is None:
+                handler = _find_handler(node.__class__)
+            handler(node, level, append, stack)
+        if len(out) > limit:
+            stream.write("".join(out))
+            out.clear()
+
+
 def encode(data, indent=0):
     """The "base" encoder. Call this with some data and hopefully it will be encoded
     as a string"""
-    if hasattr(data, "to_str"):
-        return data.to_str(indent)
-    return ENCODE_MAP[type(data)](data).to_str(indent)
+    _check_settings()
+    leaf = LEAVES.get(data.__class__)
+    if leaf is not None:
+        return leaf(data)
+    out = []
+    _encode_into(data, indent, out)
+    return "".join(out)
+
+
+def encode_to(stream, data, indent=0):
+    """Streaming version of encode. The encoded text is written to the
+    stream in chunks as it is produced so that the complete document never
+    has to exist in memory at once. The output is identical to encode"""
+    out = []
+    _encode_into(data, indent, out, stream)
+    stream.write("".join(out))
+
+
+def encode_iter_to(stream, values, indent=0, opening="[", closing="]"):
+    """Write a sequence of values to the stream as a RON list. The values
+    can be any iterable (eg a generator), and each one is encoded and written
+    before the next is requested."""
+    indc = ind(indent + 1)
+    out = []
+    first = True
+    for value in values:
+        out.append(f"{opening}{indc}" if first else f",{indc}")
+        first = False
+        _encode_into(value, indent + 1, out, stream)
+    if first:
+        out.append(opening + closing)
+    else:
+        out.append(f"{ind(indent)}{closing}")
+    stream.write("".join(out))
@@ -0,0 +1,355 @@
+""" Reads RON back into the node types of ron.py, eg to check an export or
+to compare it with the previous one (see scene_diff.py).
+
+The text is split into tokens with a single regular expression, a chunk at a
+time, so large scenes are read without loading the whole file:
+
+```
+with open("scene.scn", encoding="utf-8") as scene:
+    for entity in ron_parser.iter_list(scene):
+        ...
+```
+
+Leaves come back as python values (str, int, float, bool), and {"type": ...,
+"value": ...} maps as TypedValues, so that re-encoding a parsed document
+gives the same text as the original.
+"""
+import gc
+import re
+import contextlib
+
+from . import ron
+
+
+# How much text to tokenize at a time when reading a stream
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Longest token (eg a string) that can be split across chunks
+MAX_TOKEN_SIZE = 16 * 1024 * 1024
+
+_NUMBER = r"[-+]?\.?\d(?:[\w.]|(?<=[eE])[-+])*"
+
+# Each token is one of:
+#   a typed leaf value, eg {"type":"f32","value":1.5}, which is most of a scene
+#   a string, or a map key with its colon
+#   a comment
+#   a number
+#   an identifier, or a field name with its colon
+#   any other single character (punctuation, or the start of an unterminated
+#   string or comment, which is then an error)
+# The typed values and keys only save work: if they are split up (eg across
+# two chunks) they are parsed the same from their separate tokens
+_TOKEN = re.compile(
+    r"\s*("
+    r'\{\s*"type"\s*:\s*"[^"\\]*"\s*,\s*"value"\s*:\s*(?:'
+    + _NUMBER
+    + r"|true|false)\s*\}"
+    r'|"[^"\\]*(?:\\.[^"\\]*)*"(?:\s*:)?'
+    r"|//[^\n]*"
+    r"|/\*.*?\*/"
+    r"|" + _NUMBER + r"|[-+]?[A-Za-z_]\w*(?:\s*:)?"
+    r"|\S)",
+    re.DOTALL,
+)
+
+_TYPED_LEAF = re.compile(r'\{\s*"type"\s*:\s*"([^"\\]*)"\s*,\s*"value"\s*:\s*(\S+?)\s*\}')
+
+_ESCAPE = re.compile(
+    r"\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|x[0-9a-fA-F]{2}|.)",
+    re.DOTALL,
+)
+
+_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "0": "\0",
+    "\\": "\\",
+    '"': '"',
+    "'": "'",
+}
+
+# Identifiers that are values rather than enum variants
+_KEYWORDS = {"true": True, "false": False}
+for _sign in ("", "+", "-"):
+    _KEYWORDS[_sign + "inf"] = float(_sign + "inf")
+    _KEYWORDS[_sign + "NaN"] = _KEYWORDS[_sign + "nan"] = float(_sign + "nan")
+
+_OPENING = {"]": "[", ")": "(", "}": "{"}
+
+# Parser states
+_VALUE_OR_CLOSE = 0
+_SEPARATOR_OR_CLOSE = 1
+_VALUE = 2
+_FIELD_OR_CLOSE = 3
+
+
+def _unescape(match):
+    escape = match.group(1)
+    if escape in _ESCAPES:
+        return _ESCAPES[escape]
+    if escape[0] in "xuU":
+        return chr(int(escape[1:].strip("{}"), 16))
+    raise ValueError(f"Unknown escape \\{escape} in string")
+
+
+def _string(token):
+    if len(token) < 2 or token[-1] != '"':
+        raise ValueError("Unterminated string")
+    text = token[1:-1]
+    if "\\" in text:
+        text = _ESCAPE.sub(_unescape, text)
+    return text
+
+
+def _number(token):
+    unsigned = token.lstrip("+-")
+    try:
+        if unsigned[:1].isalpha():
+            return _KEYWORDS[token]
+        if unsigned[:2] in ("0x", "0b", "0o"):
+            return int(token.replace("_", ""), 0)
+        if "." in token or "e" in token or "E" in token:
+            return float(token.replace("_", ""))
+        return int(token.replace("_", ""))
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid number {token}") from None
+
+
+def tokenize_text(text):
+    """The tokens of a complete document, as a list of strings"""
+    return _TOKEN.findall(text)
+
+
+def tokenize(stream, chunk_size=READ_CHUNK_SIZE):
+    """Generate the tokens read from a text stream, a chunk at a time"""
+    carry = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        text = carry + chunk if carry else chunk
+        tokens = _TOKEN.findall(text)
+        if not chunk:
+            yield from tokens
+            return
+        if not tokens:
+            carry = ""
+            continue
+
+        # The last token may continue in the next chunk, as may a string or
+        # comment that is unterminated in this one (and so has been split
+        # up into single characters)
+        incomplete = len(tokens) - 1
+        for lone in ('"', "/"):
+            try:
+                incomplete = min(incomplete, tokens.index(lone))
+            except ValueError:
+                pass
+        if incomplete == len(tokens) - 1:
+            cut = text.rindex(tokens[-1])
+        else:
+            for index, match in enumerate(_TOKEN.finditer(text)):
+                if index == incomplete:
+                    cut = match.start(1)
+                    break
+        carry = text[cut:]
+        if len(carry) > MAX_TOKEN_SIZE:
+            raise ValueError("Unterminated string or comment")
+        yield from tokens[:incomplete]
+
+
+def _close(frame):
+    """The node for a container whose closing bracket has been reached"""
+    kind, values, variant = frame
+    if kind == "[":
+        return ron.List(*values)
+    if kind == "{":
+        if len(values) == 4 and values[0] == "type" and values[2] == "value":
+            return ron.TypedValue(values[1], values[3])
+        items = iter(values)
+        return ron.Map(**dict(zip(items, items)))
+    if kind == "(":
+        node = ron.Tuple(*values)
+    else:
+        items = iter(values)
+        node = ron.Struct(**dict(zip(items, items)))
+    if variant is not None:
+        return ron.EnumValue(variant, node)
+    return node
+
+
+def _typed_leaf(token):
+    type_path, value = _TYPED_LEAF.match(token).groups()
+    if value in _KEYWORDS:
+        return ron.TypedValue(type_path, _KEYWORDS[value])
+    return ron.TypedValue(type_path, _number(value))
+
+
+def _ident(token):
+    return _KEYWORDS[token] if token in _KEYWORDS else ron.EnumValue(token)
+
+
+def _parse(tokens, items=False):
+    """Parse the tokens of one document, yielding the value of the
+    document. If items is True the document must be a list, and its items
+    are yielded one at a time instead.
+
+    Containers being parsed are kept on a stack as [kind, values, variant]
+    frames. The kind is the opening bracket, or "S" for a struct (a "(" that
+    turned out to have field names). Structs and maps keep their keys and
+    values alternating in the values list"""
+    stack = []
+    frame = None
+    state = _VALUE
+    # An identifier, until the next token shows whether it is an enum
+    # variant with a value or a value on its own
+    ident = None
+    result = None
+    done = False
+
+    for token in tokens:
+        first = token[0]
+        if ident is not None:
+            if first == "(":
+                stack.append(frame)
+                frame = ["(", [], ident]
+                ident = None
+                state = _VALUE_OR_CLOSE
+                continue
+            value = _ident(ident)
+            ident = None
+            if frame is None:
+                result, done = value, True
+            elif items and len(stack) == 1:
+                yield value
+            else:
+                frame[1].append(value)
+            state = _SEPARATOR_OR_CLOSE
+
+        if first == ",":
+            if state != _SEPARATOR_OR_CLOSE or done:
+                raise ValueError("Unexpected ,")
+            kind = frame[0]
+            if kind == "S":
+                state = _FIELD_OR_CLOSE
+            elif kind == "{" and len(frame[1]) % 2:
+                raise ValueError("Expected : after a map key")
+            else:
+                state = _VALUE_OR_CLOSE
+            continue
+
+        if token[-1] == ":" and len(token) > 1:
+            # A map key or a field name, with its colon
+            key = token[:-1].rstrip()
+            if first == '"':
+                if state != _VALUE_OR_CLOSE or frame[0] != "{":
+                    raise ValueError(f"Unexpected {token}")
+                key = _string(key)
+            elif state == _FIELD_OR_CLOSE or (
+                state == _VALUE_OR_CLOSE and frame[0] == "(" and not frame[1]
+            ):
+                frame[0] = "S"
+            else:
+                raise ValueError(f"Unexpected field {token}")
+            frame[1].append(key)
+            state = _VALUE
+            continue
+
+        if first == "/" and token[1:2] in ("/", "*"):
+            continue
+        if done:
+            raise ValueError(f"Unexpected {token} after the end of the document")
+
+        if first in "])}":
+            if frame is None or frame[0].replace("S", "(") != _OPENING[first]:
+                raise ValueError(f"Unexpected {token}")
+            if state == _VALUE or (frame[0] == "{" and len(frame[1]) % 2):
+                raise ValueError(f"Expected a value before {token}")
+            value = _close(frame)
+            frame = stack.pop()
+
+        elif first == ":":
+            # A map key that is separated from its colon by a comment
+            if frame is None or frame[0] != "{" or not len(frame[1]) % 2:
+                raise ValueError("Unexpected :")
+            if frame[1][-1].__class__ is not str:
+                raise ValueError(f"Map key {frame[1][-1]!r} is not a string")
+            state = _VALUE
+            continue
+
+        elif state & 1:
+            if state == _FIELD_OR_CLOSE:
+                raise ValueError(f"Expected a field name before {token}")
+            raise ValueError(f"Expected a separator before {token}")
+
+        elif first == "{" and len(token) > 1:
+            value = _typed_leaf(token)
+
+        elif first == '"':
+            value = _string(token)
+
+        elif first in "[({":
+            if items and frame is None and first != "[":
+                raise ValueError("Expected a list")
+            stack.append(frame)
+            frame = [first, [], None]
+            state = _VALUE_OR_CLOSE
+            continue
+
+        elif first.isalpha() or first == "_":
+            ident = token
+            continue
+
+        elif first.isdigit() or first in "+-.":
+            value = _number(token)
+
+        else:
+            raise ValueError(f"Unexpected {token}")
+
+        if frame is None:
+            if items and first not in "])}":
+                raise ValueError("Expected a list")
+            result, done = value, True
+        elif items and len(stack) == 1:
+            yield value
+        else:
+            frame[1].append(value)
+        state = _SEPARATOR_OR_CLOSE
+
+    if ident is not None and frame is None:
+        result, done = _ident(ident), True
+    if not done or (items and result.__class__ is not ron.List):
+        raise ValueError("Unexpected end of document")
+    if not items:
+        yield result
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """A parsed document is millions of new objects that all stay alive, so
+    the garbage collector's passes over them are wasted (about a third of
+    the time to parse a scene)"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def parse(text):
+    """Parse a complete RON document"""
+    with _gc_paused():
+        return next(_parse(tokenize_text(text)))
+
+
+def parse_from(stream, chunk_size=READ_CHUNK_SIZE):
+    """Parse a complete RON document from a text stream"""
+    with _gc_paused():
+        return next(_parse(tokenize(stream, chunk_size)))
+
+
+def iter_list(stream, chunk_size=READ_CHUNK_SIZE):
+    """Generate the items of the list that a RON document (eg a scene) is
+    made of, one at a time as they are read from the text stream"""
+    return _parse(tokenize(stream, chunk_size), items=True)
@@ -0,0 +1,199 @@
+""" Compares two exported scenes entity by entity and component by component.
+Run from the blender_bevy_toolkit folder with:
+
+    python -m rust_types.scene_diff old.scn new.scn
+
+Scenes can be RON or the binary format of binary.py, compressed with any
+codec of compression.py or not.
+Both files are read at the same time, one entity at a time, so entities
+that are in the same order in both scenes (as they are between two exports
+of the same blend file) are compared as soon as they are read and then
+dropped. Entities are matched by their ID, and components by their type.
+"""
+import io
+import sys
+import argparse
+
+from . import ron, binary, ron_parser
+
+try:
+    from .. import compression
+except ImportError:
+    # Run as a top-level package from the blender_bevy_toolkit folder
+    import compression
+
+
+class EntityChanges:
+    """The components of one entity that differ between two scenes"""
+
+    def __init__(self, entity_id, added, removed, changed):
+        self.entity_id = entity_id
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __str__(self):
+        names = (
+            [f"+{name}" for name in self.added]
+            + [f"-{name}" for name in self.removed]
+            + [f"~{name}" for name in self.changed]
+        )
+        return f"~ entity {self.entity_id}: " + " ".join(names)
+
+
+class SceneDiff:
+    """The differences between two scenes"""
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.unchanged = 0
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def lines(self):
+        """One line per added, removed or changed entity"""
+        for entity_id in self.added:
+            yield f"+ entity {entity_id}"
+        for entity_id in self.removed:
+            yield f"- entity {entity_id}"
+        for changes in self.changed:
+            yield str(changes)
+
+    def report(self):
+        """Counts of each kind of difference"""
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+            "unchanged": self.unchanged,
+        }
+
+
+def component_type(component):
+    """The type path a component is reflected as"""
+    if isinstance(component, ron.TypedValue):
+        return component.type_path
+    if isinstance(component, ron.Map) and "type" in component.mapping:
+        return component.mapping["type"]
+    raise ValueError(f"Component without a type: {ron.encode(component)[:80]}")
+
+
+def entity_components(entity):
+    """The ID of an entity node, and a dict of component type -> key that
+    is equal for components that encode the same. A second component of the
+    same type is named type#2 and so on"""
+    try:
+        entity_id = entity.mapping["entity"]
+        components = entity.mapping["components"].values
+    except (AttributeError, KeyError) as error:
+        raise ValueError(f"Not an entity: {ron.encode(entity)[:80]}") from error
+
+    keys = {}
+    for component in components:
+        name = component_type(component)
+        if name in keys:
+            count = 2
+            while f"{name}#{count}" in keys:
+                count += 1
+            name = f"{name}#{count}"
+        keys[name] = ron.node_key(component)
+    return entity_id, keys
+
+
+def compare_components(entity_id, old, new):
+    """EntityChanges for two dicts from entity_components, or None if they
+    are the same"""
+    added = [name for name in new if name not in old]
+    removed = [name for name in old if name not in new]
+    changed = [name for name in new if name in old and new[name] != old[name]]
+    if added or removed or changed:
+        return EntityChanges(entity_id, added, removed, changed)
+    return None
+
+
+def diff_entities(old_entities, new_entities):
+    """Compare two iterables of entity nodes. Returns a SceneDiff"""
+    diff = SceneDiff()
+    # Entities read from one scene that haven't been seen in the other yet
+    pending_old = {}
+    pending_new = {}
+
+    def compare(entity_id, old, new):
+        changes = compare_components(entity_id, old, new)
+        if changes is None:
+            diff.unchanged += 1
+        else:
+            diff.changed.append(changes)
+
+    done = object()
+    old_entities = iter(old_entities)
+    new_entities = iter(new_entities)
+    while True:
+        old = next(old_entities, done)
+        new = next(new_entities, done)
+        if old is done and new is done:
+            break
+        if old is not done:
+            entity_id, components = entity_components(old)
+            if entity_id in pending_new:
+                compare(entity_id, components, pending_new.pop(entity_id))
+            else:
+                pending_old[entity_id] = components
+        if new is not done:
+            entity_id, components = entity_components(new)
+            if entity_id in pending_old:
+                compare(entity_id, pending_old.pop(entity_id), components)
+            else:
+                pending_new[entity_id] = components
+
+    diff.removed = sorted(pending_old)
+    diff.added = sorted(pending_new)
+    diff.changed.sort(key=lambda changes: changes.entity_id)
+    return diff
+
+
+def iter_entities(path):
+    """Generate the entities of a scene file, one at a time"""
+    with compression.open_input(path) as scene:
+        is_binary = scene.read(len(binary.MAGIC)) == binary.MAGIC
+    with compression.open_input(path) as scene:
+        if is_binary:
+            yield from binary.iter_list_from(scene)
+        else:
+            text = io.TextIOWrapper(scene, encoding="utf-8")
+            try:
+                yield from ron_parser.iter_list(text)
+            finally:
+                text.detach()
+
+
+def diff_files(old_path, new_path):
+    """Compare two scene files. Returns a SceneDiff"""
+    return diff_entities(iter_entities(old_path), iter_entities(new_path))
+
+
+def main(argv=None):
+    """Command line entry point. Exits with 1 if the scenes differ"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("old", help="Scene file exported before")
+    parser.add_argument("new", help="Scene file exported after")
+    parser.add_argument(
+        "--summary", action="store_true", help="Only print the counts"
+    )
+    args = parser.parse_args(argv)
+
+    diff = diff_files(args.old, args.new)
+    if not args.summary:
+        for line in diff.lines():
+            sys.stdout.write(line + "\n")
+    sys.stdout.write(
+        " ".join(f"{name}={count}" for name, count in diff.report().items()) + "\n"
+    )
+    return 1 if diff else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+""" Test that binary.py reads back what it writes """
+import io
+
+from . import ron, binary, F32, Quat
+
+
+def round_trip(data):
+    """Encode and decode, checking the result encodes to the same RON"""
+    decoded = binary.decode(binary.encode(data))
+    assert ron.encode(decoded) == ron.encode(data)
+    return decoded
+
+
+def test_leaves():
+    """Python values and their wrappers come back as python values"""
+    for value in (True, False, 0, 1, -1, 2**40, -(2**63), 1.5, -0.0, "", "asdf", "ü"):
+        assert binary.decode(binary.encode(value)) == value
+    round_trip(ron.List(ron.Int(-7), ron.Str("x"), ron.Bool(True), ron.Float(2.5)))
+
+
+def test_containers():
+    """Each node class keeps its brackets"""
+    round_trip(
+        ron.Struct(
+            a=ron.List(1, 2, ron.Tuple(3, 4.0)),
+            b=ron.Map(key=ron.EnumValue("Some", 1), other=ron.EnumValue("None")),
+            c=ron.List(),
+            d=ron.Vector(1.0, 2.0),
+        )
+    )
+
+
+def test_typed_values():
+    """Reflected types and hand written Map(type, value) are both written as
+    typed values"""
+    decoded = round_trip(ron.List(F32(1.25), ron.Map(type="f32", value=1.25)))
+    assert all(isinstance(v, ron.TypedValue) for v in decoded.values)
+    round_trip(Quat([1.0, 0.0, 0.0, 0.0]))
+
+
+def test_symbols():
+    """Repeated names are only written once"""
+    one = len(binary.encode(ron.List(ron.Map(some_long_field_name=1))))
+    two = len(binary.encode(ron.List(*[ron.Map(some_long_field_name=1)] * 2)))
+    assert two - one < len("some_long_field_name")
+
+
+def test_templates_and_interned():
+    """Filled templates and interned nodes are written as what they stand for"""
+    template = ron.Template(ron.Map(x=F32(ron.Slot("x")), y=ron.Slot("y")))
+    filled = template.fill(x=1.5, y=template.fill(x=2.5, y=ron.List()))
+    round_trip(ron.List(filled, ron.intern(ron.Map(a=1)), ron.intern(ron.Map(a=1))))
+
+
+def test_encode_iter_to():
+    """Streamed values are read back as a list"""
+    stream = io.BytesIO()
+    binary.encode_iter_to(stream, (ron.Map(i=i) for i in range(3)), 3)
+    stream.seek(0)
+    decoded = binary.decode_from(stream)
+    assert ron.encode(decoded) == ron.encode(ron.List(*(ron.Map(i=i) for i in range(3))))
+
+    try:
+        binary.encode_iter_to(io.BytesIO(), iter([1]), 2)
+    except ValueError:
+        return
+    assert False, "Expected a ValueError"
+
+
+def test_errors():
+    """Raw text can't be converted, and bad data is rejected"""
+    data = binary.encode(ron.List(1, 2))
+    bad_data = (b"", b"XXXX" + data[4:], data[:-1], data + b"\0", data[:5] + b"\xff")
+    cases = [(TypeError, binary.encode, ron.Raw("1"))]
+    cases += [(ValueError, binary.decode, bad) for bad in bad_data]
+    for error, function, argument in cases:
+        try:
+            function(argument)
+        except error:
+            continue
+        assert False, f"Expected a {error.__name__} for {argument!r}"
@@ -1,4 +1,7 @@
 """ Test that ron.py produces valid RON """
+import io
+import pickle
+
 from . import ron
 
 
@@ -61,3 +64,134 @@ def test_enumvalue():
     assert ron.encode(ron.EnumValue("Click", ron.Tuple(1, 2))) == "Click(1,2)"
     assert ron.encode(ron.EnumValue("Some", ron.Tuple("Value"))) == 'Some("Value")'
     assert ron.encode(ron.EnumValue("None")) == "None"
+
+
+def test_encode_to():
+    """Streaming to a file gives the same result as encoding to a string"""
+    data = ron.List(
+        ron.Struct(entity=1, components=ron.List(ron.Map(type="f32", value=1.5))),
+        ron.Tuple("A", ron.EnumValue("Some", ron.Tuple(2))),
+        ron.Map(),
+        ron.List(),
+    )
+    for indent_size in (0, 1):
+        ron.INDENT_SIZE = indent_size
+        stream = io.StringIO()
+        ron.encode_to(stream, data)
+        assert stream.getvalue() == ron.encode(data)
+    ron.INDENT_SIZE = 0
+
+
+def test_encode_iter_to():
+    """Any iterable can be streamed out as a list"""
+    stream = io.StringIO()
+    ron.encode_iter_to(stream, (i for i in range(3)))
+    assert stream.getvalue() == "[0,1,2]"
+
+    stream = io.StringIO()
+    ron.encode_iter_to(stream, iter(()))
+    assert stream.getvalue() == "[]"
+
+
+def test_raw():
+    """Pre-encoded text is inserted unchanged"""
+    assert ron.encode(ron.List(ron.Raw("(entity:1)"), 2)) == "[(entity:1),2]"
+
+
+def test_typed_value():
+    """A TypedValue is encoded exactly like the equivalent Map, at any
+    indent size and nesting depth"""
+    assert ron.encode(ron.TypedValue("f32", 1.5)) == '{"type":"f32","value":1.5}'
+    for indent_size in (0, 1, 2):
+        ron.INDENT_SIZE = indent_size
+        for value in (1.5, ron.Tuple(1, 2), ron.TypedValue("bool", True)):
+            typed = ron.List(ron.Struct(a=ron.TypedValue("f32", value)))
+            mapped = ron.List(ron.Struct(a=ron.Map(type="f32", value=value)))
+            assert ron.encode(typed) == ron.encode(mapped)
+    ron.INDENT_SIZE = 0
+
+
+def test_template():
+    """A filled template encodes the same as the tree it was made from, and
+    slots can hold any value"""
+    template = ron.Template(
+        ron.Map(type="f32", value=ron.Tuple(ron.Slot("a"), ron.Slot("b")))
+    )
+    for indent_size in (0, 1, 2):
+        ron.INDENT_SIZE = indent_size
+        for a, b in ((1.5, True), (ron.List(1, 2), ron.Struct(c="d"))):
+            filled = ron.List(template.fill(a=a, b=b), 3)
+            tree = ron.List(ron.Map(type="f32", value=ron.Tuple(a, b)), 3)
+            assert ron.encode(filled) == ron.encode(tree)
+    ron.INDENT_SIZE = 0
+
+
+def test_slot_outside_template():
+    """Slots only make sense inside a template"""
+    try:
+        ron.encode(ron.List(ron.Slot("a")))
+    except ValueError:
+        return
+    assert False, "Expected a ValueError"
+
+
+def test_intern():
+    """Interned nodes with the same value share their encoded text, and
+    values that only look equal are kept apart"""
+    ron.INTERNED.clear()
+    data = ron.List(
+        ron.intern(ron.Map(type="f32", value=ron.Float(0.0))),
+        ron.intern(ron.Map(type="f32", value=ron.Float(0.0))),
+        ron.intern(ron.Map(type="f32", value=ron.Float(-0.0))),
+        ron.intern(ron.Map(type="f32", value=0)),
+    )
+    assert ron.encode(data) == (
+        '[{"type":"f32","value":0.0},{"type":"f32","value":0.0},'
+        '{"type":"f32","value":-0.0},{"type":"f32","value":0}]'
+    )
+    assert ron.INTERNED.report() == {"intern_hits": 1, "intern_misses": 3}
+
+
+def test_vector():
+    """Vectors encode the same as tuples"""
+    assert ron.encode(ron.Vector()) == "()"
+    assert ron.encode(ron.Vector(1.5, -2, 0.1)) == "(1.5,-2,0.1)"
+    ron.INDENT_SIZE = 1
+    assert ron.encode(ron.List(ron.Vector(1.5, 2.0))) == ron.encode(
+        ron.List(ron.Tuple(1.5, 2.0))
+    )
+    ron.INDENT_SIZE = 0
+
+
+def test_float_precision():
+    """f32 precision writes the shortest text for the single precision
+    value, wherever the float is"""
+    ron.FLOAT_PRECISION = "f32"
+    try:
+        template = ron.Template(ron.Tuple(ron.Slot("a"), ron.Slot("b")))
+        assert ron.encode(0.1) == "0.1"
+        assert ron.encode(ron.Float(0.10000000149011612)) == "0.1"
+        assert ron.encode(ron.Vector(0.30000001192092896, 1e39, -0.0)) == (
+            "(0.3,inf,-0.0)"
+        )
+        assert ron.encode(template.fill(a=0.10000000149011612, b=2.5)) == "(0.1,2.5)"
+        assert ron.shortest_f32(123456789.0) == "123456790.0"
+    finally:
+        ron.FLOAT_PRECISION = "f64"
+    assert ron.encode(0.10000000149011612) == "0.10000000149011612"
+
+
+def test_pickle():
+    """Nodes can be pickled (eg to be encoded in another process), and
+    templates are not duplicated within a process"""
+    template = ron.Template(ron.Struct(a=ron.Slot("a")))
+    data = ron.List(
+        template.fill(a=ron.Vector(1.0, 2.0)),
+        ron.intern(ron.Map(type="f32", value=ron.Float(1.5))),
+        ron.EnumValue("Some", ron.Tuple(ron.Str("x"), ron.Int(1), ron.Bool(False))),
+        ron.TypedValue("f32", 2.5),
+        ron.Raw("(entity:1)"),
+    )
+    copy = pickle.loads(pickle.dumps(data))
+    assert ron.encode(copy) == ron.encode(data)
+    assert copy.values[0].template is template
@@ -0,0 +1,82 @@
+""" Test that ron_parser.py reads back what ron.py writes """
+import io
+
+from . import ron, ron_parser, bench_ron
+
+
+DOCUMENT = ron.List(
+    ron.Struct(entity=1, components=ron.List(ron.Map(type="f32", value=1.5))),
+    ron.Tuple("A", ron.EnumValue("Some", ron.Tuple(2)), ron.EnumValue("None")),
+    ron.EnumValue("Event", ron.Struct(id=3)),
+    ron.Map(key=ron.Tuple(), other=ron.List()),
+    ron.Struct(),
+    ron.Vector(1.5, -0.0, 1e-07, float("inf")),
+    ron.TypedValue("alloc::string::String", 'quote " and \\ and \n and ü'),
+    ron.TypedValue("bool", True),
+    ron.Map(type="i32", value=ron.Int(-12)),
+)
+
+
+def test_round_trip():
+    """Parsing and encoding again gives the same text, at any indent"""
+    for indent_size in (0, 1, 2):
+        ron.INDENT_SIZE = indent_size
+        text = ron.encode(DOCUMENT)
+        assert ron.encode(ron_parser.parse(text)) == text
+    ron.INDENT_SIZE = 0
+
+
+def test_values():
+    """Leaves are python values, and containers are ron nodes"""
+    assert ron_parser.parse("  12 ") == 12
+    assert ron_parser.parse("-1.5e3") == -1500.0
+    assert ron_parser.parse('"a\\"b"') == 'a"b'
+    assert ron_parser.parse("false") is False
+    assert ron_parser.parse("None").variant == "None"
+    typed = ron_parser.parse('{"type":"f32", // comment\n "value":1.5}')
+    assert (typed.type_path, typed.value) == ("f32", 1.5)
+    struct = ron_parser.parse("Some((a:1,b:[1,2,],))")
+    assert struct.variant == "Some"
+    assert ron.encode(struct.value) == "((a:1,b:[1,2]))"
+
+
+def test_strings():
+    """Strings with quotes and control characters are written with RON's
+    escapes and read back unchanged"""
+    assert ron.encode("a\"b'c") == '"a\\"b\'c"'
+    assert ron.encode("bell\x07") == '"bell\\u{7}"'
+    for text in ("'\"", "\\", "\n\r\t\0", "\x08\x0c\x1b\x7f", "ü \u200b"):
+        encoded = ron.encode(text)
+        assert "\\b" not in encoded and "\\f" not in encoded
+        assert ron_parser.parse(encoded) == text
+
+
+def test_stream():
+    """A scene can be read in chunks of any size, one entity at a time"""
+    ron.INDENT_SIZE = 1
+    scene = bench_ron.make_scene(20)
+    text = ron.encode(scene)
+    for chunk_size in (1, 7, 100, 1 << 20):
+        entities = list(ron_parser.iter_list(io.StringIO(text), chunk_size))
+        assert len(entities) == 20
+        assert ron.encode(ron.List(*entities)) == text
+        parsed = ron_parser.parse_from(io.StringIO(text), chunk_size)
+        assert ron.encode(parsed) == text
+    ron.INDENT_SIZE = 0
+
+
+def test_errors():
+    """Documents that aren't valid RON are rejected"""
+    for text in ("[1,,2]", "[1 2]", "(a:1,2)", "{1:2}", '"abc', "[", "1 2", "(a:)",
+                 '{"a"}', "]", "/* x", "", "[1)"):
+        try:
+            ron_parser.parse(text)
+        except ValueError:
+            continue
+        assert False, f"Expected a ValueError for {text!r}"
+
+    try:
+        list(ron_parser.iter_list(io.StringIO("(a:1)")))
+    except ValueError:
+        return
+    assert False, "Expected a ValueError"
@@ -0,0 +1,59 @@
+""" Test that scene_diff.py finds the changed entities and components """
+import os
+import gzip
+import zlib
+import tempfile
+
+from . import ron, binary, scene_diff, bench_ron
+
+
+def entity(entity_id, *components):
+    """An entity as the exporter writes it"""
+    return ron.Struct(entity=entity_id, components=ron.List(*components))
+
+
+def test_diff_entities():
+    """Entities are matched by ID and components by type, whatever order
+    the entities are in"""
+    transform = ron.Map(type="Transform", value=ron.Tuple(1.0, 2.0))
+    moved = ron.Map(type="Transform", value=ron.Tuple(1.0, 3.0))
+    visible = ron.Map(type="Visibility", struct=ron.Map(is_visible=True))
+    old = [entity(0, transform), entity(1, transform, visible), entity(2, transform)]
+    new = [entity(3, transform), entity(1, moved), entity(0, transform)]
+
+    diff = scene_diff.diff_entities(old, new)
+    assert diff.added == [3]
+    assert diff.removed == [2]
+    assert [(c.entity_id, c.added, c.removed, c.changed) for c in diff.changed] == [
+        (1, [], ["Visibility"], ["Transform"])
+    ]
+    assert diff.report() == {"added": 1, "removed": 1, "changed": 1, "unchanged": 1}
+    assert not scene_diff.diff_entities(old, old)
+
+
+def test_diff_files():
+    """Scenes in any of the formats can be compared with each other"""
+    scene = bench_ron.make_scene(10)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = [
+            os.path.join(folder, name)
+            for name in ("a.scn", "b.scn.gz", "c.scn", "d.scn.gz", "e", "f.scn.zz")
+        ]
+        with open(paths[0], "w", encoding="utf-8") as scene_file:
+            ron.encode_to(scene_file, scene)
+        with gzip.open(paths[1], "wt", encoding="utf-8") as scene_file:
+            ron.encode_to(scene_file, scene)
+        with open(paths[2], "wb") as scene_file:
+            binary.encode_to(scene_file, scene)
+        with gzip.open(paths[3], "wb") as scene_file:
+            binary.encode_to(scene_file, scene)
+        # zlib, recognised by its header and by its extension
+        with open(paths[4], "wb") as scene_file:
+            scene_file.write(zlib.compress(binary.encode(scene)))
+        with open(paths[5], "wb") as scene_file:
+            scene_file.write(zlib.compress(ron.encode(scene).encode("utf-8")))
+
+        for path in paths[1:]:
+            diff = scene_diff.diff_files(paths[0], path)
+            assert not diff
+            assert diff.unchanged == 10
@@ -0,0 +1,45 @@
+""" Test that the fingerprints kept in the disk cache are stable """
+import os
+import tempfile
+
+import bpy
+
+from . import cache, gltf
+
+
+def fingerprints(name):
+    """The entity fingerprint and mesh hash of an object"""
+    obj = bpy.data.objects[name]
+    return cache.object_fingerprint(obj, (0, None, ())), gltf.mesh_hash(obj, {})
+
+
+def test_fingerprint_reload():
+    """Fingerprints don't change when the blend file is saved and opened
+    again, or when other objects use the same data"""
+    bpy.ops.wm.read_homefile(use_empty=True)
+    bpy.ops.mesh.primitive_cube_add()
+    cube = bpy.context.active_object
+    cube.name = "Cube"
+    material = bpy.data.materials.new("Material")
+    material.use_nodes = True
+    cube.data.materials.append(material)
+    before = fingerprints("Cube")
+    assert None not in before
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=path)
+        bpy.ops.wm.open_mainfile(filepath=path)
+        assert fingerprints("Cube") == before
+
+    copy = bpy.data.objects.new("Copy", bpy.data.objects["Cube"].data)
+    bpy.context.scene.collection.objects.link(copy)
+    copy.select_set(True)
+    material = bpy.data.materials["Material"]
+    for node in material.node_tree.nodes:
+        node.select = not node.select
+        node.location.x += 100
+    assert fingerprints("Cube") == before
+
+    bpy.data.objects["Cube"].location.x += 1
+    assert fingerprints("Cube")[0] != before[0]
@@ -0,0 +1,42 @@
+""" Test that mesh_hash sees the changes that alter the exported file """
+import bpy
+
+from . import gltf
+
+
+def test_mesh_hash_normals():
+    """Shading, sharp edges and custom normals change the exported normals"""
+    bpy.ops.wm.read_homefile(use_empty=True)
+    bpy.ops.mesh.primitive_cube_add()
+    cube = bpy.context.active_object
+    mesh = cube.data
+    hashes = [gltf.mesh_hash(cube, {})]
+    assert gltf.mesh_hash(cube, {}) == hashes[0]
+
+    mesh.shade_smooth()
+    hashes.append(gltf.mesh_hash(cube, {}))
+    mesh.edges[0].use_edge_sharp = True
+    hashes.append(gltf.mesh_hash(cube, {}))
+    mesh.normals_split_custom_set_from_vertices([(0.0, 0.0, 1.0)] * len(mesh.vertices))
+    hashes.append(gltf.mesh_hash(cube, {}))
+    assert len(set(hashes)) == len(hashes)
+
+    # Hashing doesn't change the mesh
+    assert gltf.mesh_hash(cube, {}) == hashes[-1]
+
+
+def test_mesh_hash_attributes():
+    """Attributes are hashed, but not what is selected"""
+    bpy.ops.wm.read_homefile(use_empty=True)
+    bpy.ops.mesh.primitive_cube_add()
+    cube = bpy.context.active_object
+    before = gltf.mesh_hash(cube, {})
+
+    cube.data.vertices[0].select = not cube.data.vertices[0].select
+    assert gltf.mesh_hash(cube, {}) == before
+
+    weights = cube.data.attributes.new("weight", "FLOAT", "POINT")
+    assert gltf.mesh_hash(cube, {}) != before
+    before = gltf.mesh_hash(cube, {})
+    weights.data[3].value = 0.5
+    assert gltf.mesh_hash(cube, {}) != before
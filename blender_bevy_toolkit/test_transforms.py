@@ -0,0 +1,83 @@
+""" Test that Transform and GlobalTransform describe the same placement """
+import re
+
+import bpy
+import numpy
+import mathutils
+
+from . import transforms
+from .rust_types import ron
+from .definitions.bevy_transform.transform import Transform
+from .definitions.bevy_transform.global_transform import GlobalTransform
+
+
+def make_hierarchy():
+    """A rotated, scaled and moved parent with a child that is too"""
+    bpy.ops.wm.read_homefile(use_empty=True)
+    parent = bpy.data.objects.new("Parent", None)
+    child = bpy.data.objects.new("Child", None)
+    for obj in (parent, child):
+        bpy.context.scene.collection.objects.link(obj)
+    child.parent = parent
+    parent.location = (1.0, 2.0, 3.0)
+    parent.rotation_euler = (0.3, -0.5, 1.2)
+    parent.scale = (2.0, 2.0, 2.0)
+    child.location = (-4.0, 0.5, 2.0)
+    child.rotation_euler = (1.0, 0.2, -0.7)
+    child.scale = (1.0, 3.0, 0.5)
+    bpy.context.view_layer.update()
+    return parent, child
+
+
+def affine(values):
+    """The 4x4 matrix of GlobalTransform values (x, y, z of each column)"""
+    matrix = numpy.identity(4)
+    matrix[:3, :] = numpy.reshape(values, (4, 3)).T
+    return matrix
+
+
+def transform_matrix(values):
+    """The 4x4 matrix of Transform values"""
+    translation, rotation, scale = values[:3], values[3:7], values[7:]
+    return numpy.array(
+        mathutils.Matrix.LocRotScale(
+            translation, mathutils.Quaternion(rotation), scale
+        )
+    )
+
+
+def numbers(node):
+    """The numbers in an encoded component, in order"""
+    return [float(n) for n in re.findall(r"-?\d+\.\d+(?:e-?\d+)?", ron.encode(node))]
+
+
+def test_compose():
+    """A parent's GlobalTransform with its child's Transform gives the
+    child's GlobalTransform, in bevy's Y-up"""
+    parent, child = make_hierarchy()
+    bulk = transforms.BulkTransforms(
+        bpy.context.scene.objects, {parent: [child]}
+    )
+    composed = affine(bulk.global_transform(parent)) @ transform_matrix(
+        bulk.transform(child)
+    )
+    assert numpy.allclose(composed, affine(bulk.global_transform(child)), atol=1e-4)
+
+    # Blender's up (Z) is bevy's up (Y)
+    up = affine(bulk.global_transform(child)) @ (0.0, 1.0, 0.0, 0.0)
+    blender_up = numpy.array(child.matrix_world) @ (0.0, 0.0, 1.0, 0.0)
+    assert numpy.allclose(up[:3], blender_up[[0, 2, 1]] * (1, 1, -1), atol=1e-4)
+
+
+def test_without_bulk():
+    """The components give the same values one object at a time"""
+    parent, child = make_hierarchy()
+    entity_ids = {parent: 0, child: 1}
+    bulk = transforms.BulkTransforms(
+        bpy.context.scene.objects, {parent: [child]}
+    )
+    for component in (Transform, GlobalTransform):
+        for obj in (parent, child):
+            fast = component.encode({"entity_ids": entity_ids, "transforms": bulk}, obj)
+            slow = component.encode({"entity_ids": entity_ids}, obj)
+            assert numpy.allclose(numbers(fast), numbers(slow), atol=1e-4)
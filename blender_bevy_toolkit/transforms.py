@@ -0,0 +1,209 @@
+""" Reads the transforms of every object in the scene at once.
+
+Rather than each Transform/GlobalTransform component reading a matrix from
+its object and decomposing it with mathutils, the matrices of all objects are
+read with one foreach_get into a numpy array, and converted and decomposed
+for all of them together. The components then look up their values with
+BulkTransforms.transform and BulkTransforms.global_transform.
+
+Given the hierarchy the scene is exported with, each Transform is computed
+from the world matrices of the object and of its exported parent, so it is
+always relative to the GlobalTransform of the entity it is parented to.
+
+The values are the same as the components compute one object at a time:
+each matrix is converted from blender's Z-up to bevy's Y-up (see Y_UP), and
+then decomposed the same way as Matrix.decompose. As both components come
+from the same converted matrices, a parent's GlobalTransform combined with
+its child's Transform gives the child's GlobalTransform.
+"""
+import time
+import logging
+
+from .utils import jdict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Blender is Z-up and bevy (like glTF) is Y-up: blender's (x, y, z) is bevy's
+# (x, z, -y). A matrix M is converted to Y_UP @ M @ Y_UP.transposed()
+Y_UP = (
+    (1.0, 0.0, 0.0, 0.0),
+    (0.0, 0.0, 1.0, 0.0),
+    (0.0, -1.0, 0.0, 0.0),
+    (0.0, 0.0, 0.0, 1.0),
+)
+
+
+def read_matrices(objects, attribute):
+    """An (N, 4, 4) float32 array of a matrix attribute of each object in a
+    bpy collection. As in blender's C code, matrices are indexed [column][row]"""
+    values = numpy.empty(len(objects) * 16, dtype=numpy.float32)
+    objects.foreach_get(attribute, values)
+    return values.reshape(-1, 4, 4)
+
+
+def decompose(matrices):
+    """Split (N, 4, 4) [column][row] matrices into (N, 3) translations,
+    (N, 4) wxyz quaternions and (N, 3) scales, as Matrix.decompose does"""
+    matrices = matrices.astype(numpy.float64)
+    translation = matrices[:, 3, :3]
+
+    # Each column of the 3x3 part is an axis, scaled
+    axes = matrices[:, :3, :3]
+    scale = numpy.sqrt((axes * axes).sum(axis=2))
+    safe = numpy.where(scale > 1e-35, scale, 1.0)
+    rotation = numpy.where(scale[:, :, None] > 1e-35, axes / safe[:, :, None], 0.0)
+
+    # A mirrored rotation is a rotation with negative scales
+    negative = numpy.linalg.det(rotation) < 0
+    rotation[negative] *= -1
+    scale[negative] *= -1
+
+    return translation, matrix_to_quaternion(rotation), scale
+
+
+def matrix_to_quaternion(rotation):
+    """(N, 4) wxyz quaternions for (N, 3, 3) [column][row] rotation matrices,
+    choosing the largest component to divide by for each matrix"""
+    m = rotation
+    m00, m11, m22 = m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]
+    traces = numpy.stack(
+        [
+            1.0 + m00 + m11 + m22,
+            1.0 + m00 - m11 - m22,
+            1.0 - m00 + m11 - m22,
+            1.0 - m00 - m11 + m22,
+        ],
+        axis=1,
+    )
+    largest = traces.argmax(axis=1)
+    s = 0.5 / numpy.sqrt(numpy.maximum(traces[numpy.arange(len(m)), largest], 1e-30))
+
+    # Each case gives all four components from the matrix, divided by the
+    # (4 * largest component) in s
+    differences = (
+        m[:, 1, 2] - m[:, 2, 1],
+        m[:, 2, 0] - m[:, 0, 2],
+        m[:, 0, 1] - m[:, 1, 0],
+    )
+    sums = (
+        m[:, 0, 1] + m[:, 1, 0],
+        m[:, 2, 0] + m[:, 0, 2],
+        m[:, 1, 2] + m[:, 2, 1],
+    )
+    quaternion = numpy.empty((len(m), 4))
+    cases = (
+        (traces[:, 0], differences[0], differences[1], differences[2]),
+        (differences[0], traces[:, 1], sums[0], sums[1]),
+        (differences[1], sums[0], traces[:, 2], sums[2]),
+        (differences[2], sums[1], sums[2], traces[:, 3]),
+    )
+    for case, components in enumerate(cases):
+        rows = largest == case
+        for axis, component in enumerate(components):
+            quaternion[rows, axis] = component[rows] * s[rows]
+
+    # q and -q are the same rotation. Keep w positive, as blender does
+    quaternion[quaternion[:, 0] < 0] *= -1
+    quaternion /= numpy.linalg.norm(quaternion, axis=1)[:, None]
+    return quaternion
+
+
+def to_y_up(matrices):
+    """Convert (N, 4, 4) [column][row] matrices from blender's Z-up to bevy's
+    Y-up (see Y_UP)"""
+    conversion = numpy.array(Y_UP, dtype=matrices.dtype)
+    # (Y_UP @ M @ Y_UP.T).T is Y_UP @ M.T @ Y_UP.T, so transposed matrices
+    # are converted the same way
+    return conversion @ matrices @ conversion.T
+
+
+def transform_values(matrices):
+    """(N, 10) float32 [tx, ty, tz, rw, rx, ry, rz, sx, sy, sz] Transform
+    values for (N, 4, 4) [column][row] matrices in blender's Z-up"""
+    values = numpy.concatenate(decompose(to_y_up(matrices)), axis=1)
+    # Rounded to the single precision floats that mathutils would give
+    return values.astype(numpy.float32)
+
+
+def local_matrices(world, parent_rows):
+    """The matrices of each object relative to its parent, from (N, 4, 4)
+    [column][row] world matrices and the row of each object's parent (or -1
+    for objects without one)"""
+    world = world.astype(numpy.float64)
+    local = world.copy()
+    children = numpy.flatnonzero(parent_rows >= 0)
+    parents = world[parent_rows[children]]
+
+    # In [column][row] layout, inverse(parent) @ child is child @ inverse(parent)
+    inverses = numpy.empty_like(parents)
+    invertible = numpy.abs(numpy.linalg.det(parents)) > 1e-30
+    if invertible.any():
+        inverses[invertible] = numpy.linalg.inv(parents[invertible])
+    if not invertible.all():
+        # eg a parent scaled to zero
+        inverses[~invertible] = numpy.linalg.pinv(parents[~invertible])
+
+    local[children] = world[children] @ inverses
+    return local
+
+
+class BulkTransforms:
+    """The Transform and GlobalTransform values of every object in a bpy
+    collection (eg scene.objects), read and converted together.
+
+    children is a dict of object -> its children, as exported. Without it
+    each object's own matrix_local is used.
+
+    offset is a point (eg a collection's instance_offset) that is subtracted
+    from the world matrices, so that the objects are placed relative to it"""
+
+    def __init__(self, objects, children=None, offset=None):
+        start = time.perf_counter()
+        self.rows = {obj: row for row, obj in enumerate(objects)}
+        world = read_matrices(objects, "matrix_world")
+        if offset is not None:
+            world[:, 3, :3] -= numpy.asarray(offset, dtype=numpy.float32)
+
+        if children is None:
+            local = read_matrices(objects, "matrix_local")
+        else:
+            parent_rows = numpy.full(len(self.rows), -1)
+            for parent, kids in children.items():
+                for child in kids:
+                    parent_rows[self.rows[child]] = self.rows[parent]
+            local = local_matrices(world, parent_rows)
+
+        self.transforms = transform_values(local).tolist()
+
+        # GlobalTransform is the x, y, z of each column of the world matrix
+        self.global_transforms = (
+            to_y_up(world)[:, :, :3].reshape(-1, 12).tolist()
+        )
+
+        logger.info(
+            jdict(
+                event="bulk_transforms",
+                objects=len(self.rows),
+                seconds=time.perf_counter() - start,
+            )
+        )
+
+    def transform(self, obj):
+        """[tx, ty, tz, rw, rx, ry, rz, sx, sy, sz] for an object, or None if
+        it wasn't in the collection"""
+        row = self.rows.get(obj)
+        return None if row is None else self.transforms[row]
+
+    def global_transform(self, obj):
+        """The columns x_axis, y_axis, z_axis, w_axis (translation) of the Y-up
+        world matrix, with the x, y, z of each, or None if the object wasn't
+        in the collection"""
+        row = self.rows.get(obj)
+        return None if row is None else self.global_transforms[row]
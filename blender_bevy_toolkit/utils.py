@@ -1,7 +1,27 @@
 """ Small Utility Functions """
+import os
 import json
+import hashlib
 
 
 def jdict(**kwargs):
     """Dump arguments into a JSON-encoded string"""
     return json.dumps(dict(**kwargs))
+
+
+def short_hash(*key):
+    """A short hex digest of a key, eg to make file names that are derived
+    from non-unique names unique"""
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:8]
+
+
+def scene_path(config, path):
+    """Make a path that is relative to the main scene file (as the paths of
+    meshes, prefabs and instance buffers are) relative to the scene file
+    being written, which may be in a subfolder (eg a prefab or a grid cell)"""
+    folder = os.path.dirname(config["output_filepath"])
+    output_folder = config.get("output_folder", folder)
+    if os.path.normpath(folder) == os.path.normpath(output_folder):
+        return path
+    path = os.path.relpath(os.path.join(output_folder, path), folder)
+    return path.replace(os.sep, "/")